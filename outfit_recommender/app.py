@@ -2,8 +2,12 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import pickle
+import json
 from item_based_cf import ItemBasedCollaborativeFiltering
+from als_recommender import ALSRecommender
+from ease_recommender import EASERecommender
 from content_based_recommender_optimized import OptimizedContentBasedRecommender
+from item_catalog import ItemCatalog
 import os
 from PIL import Image
 import matplotlib.pyplot as plt
@@ -842,7 +846,18 @@ st.markdown("""
 def load_collaborative_model():
     """Load the trained collaborative filtering model"""
     # Try both relative and absolute paths
+    # Directory artifacts first (the item-based model, then the EASE and ALS
+    # models), then older pickle files
     model_paths = [
+        "models/item_based_cf_model",
+        "./models/item_based_cf_model",
+        os.path.join(os.path.dirname(__file__), "models", "item_based_cf_model"),
+        "models/ease_model",
+        "./models/ease_model",
+        os.path.join(os.path.dirname(__file__), "models", "ease_model"),
+        "models/als_model",
+        "./models/als_model",
+        os.path.join(os.path.dirname(__file__), "models", "als_model"),
         "models/item_based_cf_model.pkl",
         "./models/item_based_cf_model.pkl",
         os.path.join(os.path.dirname(__file__), "models", "item_based_cf_model.pkl")
@@ -857,7 +872,13 @@ def load_collaborative_model():
     if model_path:
         try:
             # Create a new model instance and load the saved data
-            model = ItemBasedCollaborativeFiltering()
+            model_classes = {'als': ALSRecommender, 'ease': EASERecommender}
+            model_class = ItemBasedCollaborativeFiltering
+            manifest_path = os.path.join(model_path, "manifest.json")
+            if os.path.isdir(model_path) and os.path.exists(manifest_path):
+                with open(manifest_path) as f:
+                    model_class = model_classes.get(json.load(f).get('format'), ItemBasedCollaborativeFiltering)
+            model = model_class()
             model.load_model(model_path)
             st.success(f"✅ Using Collaborative Filtering Model from: {model_path}")
             return model
@@ -919,16 +940,17 @@ def load_styles_data():
     st.error("Styles data file not found!")
     return pd.DataFrame()  # Return empty DataFrame as fallback
 
-def get_item_info(item_id, styles_df):
-    """Get item information from styles dataframe"""
-    item_info = styles_df[styles_df['id'] == item_id]
-    if not item_info.empty:
-        return item_info.iloc[0]
-    return None
+@st.cache_resource
+def load_item_catalog():
+    """Build the item catalog used for all item lookups"""
+    styles_data = load_styles_data()
+    if 'id' not in styles_data.columns:
+        styles_data = pd.DataFrame({'id': pd.Series(dtype='int64')})
+    return ItemCatalog(styles_data)
 
-def display_item_details(item_id, styles_df, similarity_score=None, show_image=True, compact=False, is_collaborative=False):
+def display_item_details(item_id, catalog, similarity_score=None, show_image=True, compact=False, is_collaborative=False):
     """Display item details in a formatted way with optional image"""
-    item_info = get_item_info(item_id, styles_df)
+    item_info = get_item_info(item_id, catalog)
     if item_info is not None:
         if compact:
             # Compact display for recommendations
@@ -1000,14 +1022,14 @@ def display_item_details(item_id, styles_df, similarity_score=None, show_image=T
     else:
         st.write(f"Item ID {item_id} not found in styles database")
 
-def show_correlation_calculation(item_a_id, item_b_id, correlation_score, model, styles_df):
+def show_correlation_calculation(item_a_id, item_b_id, correlation_score, model, catalog):
     """Show detailed step-by-step correlation calculation"""
     st.markdown('<div class="correlation-calc">', unsafe_allow_html=True)
     st.markdown(f"### 🧮 Correlation Calculation: Product {item_a_id} ↔ Product {item_b_id}")
     
     # Get product names
-    item_a_info = get_item_info(item_a_id, styles_df)
-    item_b_info = get_item_info(item_b_id, styles_df)
+    item_a_info = get_item_info(item_a_id, catalog)
+    item_b_info = get_item_info(item_b_id, catalog)
     
     item_a_name = item_a_info['productDisplayName'] if item_a_info is not None else f"Product {item_a_id}"
     item_b_name = item_b_info['productDisplayName'] if item_b_info is not None else f"Product {item_b_id}"
@@ -1025,36 +1047,32 @@ def show_correlation_calculation(item_a_id, item_b_id, correlation_score, model,
     # Step 2: Find common users (from actual data)
     st.markdown("#### Step 2: Finding Common Users")
     
-    # Check if user_item_matrix exists in the model
-    user_item_matrix = None
-    if hasattr(model, 'user_item_matrix'):
-        user_item_matrix = model.user_item_matrix
-    elif isinstance(model, dict) and 'user_item_matrix' in model:
-        user_item_matrix = model['user_item_matrix']
+    # Check if the model holds a user-item rating matrix
+    has_ratings = getattr(model, 'user_item_matrix', None) is not None
     
-    if user_item_matrix is None:
+    if not has_ratings:
         st.error("❌ **Model Issue**: No user-item matrix found in the loaded model")
         total_users_a = "N/A"
         total_users_b = "N/A"
         common_users = "N/A"
     else:
-        if item_a_id in user_item_matrix.columns and item_b_id in user_item_matrix.columns:
+        if model.has_item(item_a_id) and model.has_item(item_b_id):
             # Count actual users who rated each product
-            item_a_ratings = user_item_matrix[item_a_id]
-            item_b_ratings = user_item_matrix[item_b_id]
+            item_a_ratings = model.get_item_ratings(item_a_id)
+            item_b_ratings = model.get_item_ratings(item_b_id)
             
-            total_users_a = (item_a_ratings > 0).sum()
-            total_users_b = (item_b_ratings > 0).sum()
-            common_users = ((item_a_ratings > 0) & (item_b_ratings > 0)).sum()
+            total_users_a = len(item_a_ratings)
+            total_users_b = len(item_b_ratings)
+            common_users = len(item_a_ratings.index.intersection(item_b_ratings.index))
             
             # Debug information
             st.info(f"📊 **Data Availability**: Product {item_a_id} has {total_users_a} ratings, Product {item_b_id} has {total_users_b} ratings, {common_users} users rated both products")
         else:
             # Check which products are missing
             missing_products = []
-            if item_a_id not in user_item_matrix.columns:
+            if not model.has_item(item_a_id):
                 missing_products.append(f"Product {item_a_id}")
-            if item_b_id not in user_item_matrix.columns:
+            if not model.has_item(item_b_id):
                 missing_products.append(f"Product {item_b_id}")
             
             st.warning(f"⚠️ **Data Issue**: {', '.join(missing_products)} not found in user rating matrix")
@@ -1077,14 +1095,13 @@ def show_correlation_calculation(item_a_id, item_b_id, correlation_score, model,
     use_real_data = False
     
     # Check if model has user_item_matrix and both items exist
-    if hasattr(model, 'user_item_matrix') and model.user_item_matrix is not None:
-        if item_a_id in model.user_item_matrix.columns and item_b_id in model.user_item_matrix.columns:
-            item_a_ratings = model.user_item_matrix[item_a_id]
-            item_b_ratings = model.user_item_matrix[item_b_id]
+    if has_ratings:
+        if model.has_item(item_a_id) and model.has_item(item_b_id):
+            item_a_ratings = model.get_item_ratings(item_a_id)
+            item_b_ratings = model.get_item_ratings(item_b_id)
             
-            # Find users who rated both items (non-zero ratings)
-            common_mask = (item_a_ratings > 0) & (item_b_ratings > 0)
-            common_user_ids = item_a_ratings[common_mask].index.tolist()
+            # Find users who rated both items
+            common_user_ids = item_a_ratings.index.intersection(item_b_ratings.index).tolist()
             
             if len(common_user_ids) >= 1:  # Use real data even with just 1 common user
                 # Take a sample of actual users (up to 8 for display)
@@ -1115,12 +1132,12 @@ def show_correlation_calculation(item_a_id, item_b_id, correlation_score, model,
         st.markdown("**Reason**: Real user data not available for these products")
         
         # Provide detailed explanation
-        if hasattr(model, 'user_item_matrix') and model.user_item_matrix is not None:
-            if item_a_id not in model.user_item_matrix.columns:
+        if has_ratings:
+            if not model.has_item(item_a_id):
                 st.markdown(f"- Product {item_a_id} ({item_a_name}) is not in the user rating dataset")
-            if item_b_id not in model.user_item_matrix.columns:
+            if not model.has_item(item_b_id):
                 st.markdown(f"- Product {item_b_id} ({item_b_name}) is not in the user rating dataset")
-            if item_a_id in model.user_item_matrix.columns and item_b_id in model.user_item_matrix.columns:
+            if model.has_item(item_a_id) and model.has_item(item_b_id):
                 st.markdown("- No users have rated both products in the dataset")
         else:
             st.markdown("- Model does not contain user rating matrix")
@@ -1293,14 +1310,14 @@ def show_correlation_calculation(item_a_id, item_b_id, correlation_score, model,
     
     st.markdown('</div>', unsafe_allow_html=True)
 
-def show_similarity_calculation(item_a_id, item_b_id, similarity_score, model, styles_df):
+def show_similarity_calculation(item_a_id, item_b_id, similarity_score, model, catalog):
     """Show detailed step-by-step cosine similarity calculation for content-based recommendations"""
     st.markdown('<div class="correlation-calc">', unsafe_allow_html=True)
     st.markdown(f"### 🧮 Cosine Similarity Calculation: Product {item_a_id} ↔ Product {item_b_id}")
     
     # Get product names
-    item_a_info = get_item_info(item_a_id, styles_df)
-    item_b_info = get_item_info(item_b_id, styles_df)
+    item_a_info = get_item_info(item_a_id, catalog)
+    item_b_info = get_item_info(item_b_id, catalog)
     
     item_a_name = item_a_info['productDisplayName'] if item_a_info is not None else f"Product {item_a_id}"
     item_b_name = item_b_info['productDisplayName'] if item_b_info is not None else f"Product {item_b_id}"
@@ -1490,17 +1507,14 @@ def show_similarity_calculation(item_a_id, item_b_id, similarity_score, model, s
     
     st.markdown('</div>', unsafe_allow_html=True)
 
-def get_item_info(item_id, styles_df):
-    """Get item information from styles dataframe"""
+def get_item_info(item_id, catalog):
+    """Get item information from the item catalog"""
     try:
-        item_info = styles_df[styles_df['id'] == item_id]
-        if not item_info.empty:
-            return item_info.iloc[0].to_dict()
-        return None
+        return catalog.get(item_id)
     except Exception:
         return None
 
-def get_collaborative_recommendations(selected_item_id, num_recommendations, model, styles_df):
+def get_collaborative_recommendations(selected_item_id, num_recommendations, model, catalog):
     """Handle collaborative filtering recommendations"""
     with st.spinner("Calculating correlation scores and generating recommendations..."):
         try:
@@ -1547,7 +1561,7 @@ def get_collaborative_recommendations(selected_item_id, num_recommendations, mod
                 st.markdown("### 📦 Selected Product")
                 with st.container():
                     st.markdown('<div class="product-card">', unsafe_allow_html=True)
-                    display_item_details(selected_item_id, styles_df, is_collaborative=True)
+                    display_item_details(selected_item_id, catalog, is_collaborative=True)
                     st.markdown('</div>', unsafe_allow_html=True)
                 
                 st.markdown("### 🎯 Recommendations with Correlation Analysis")
@@ -1560,7 +1574,7 @@ def get_collaborative_recommendations(selected_item_id, num_recommendations, mod
                     recommendations_data = []
                     
                     for i, (similar_item_id, correlation_score) in enumerate(similar_items, 1):
-                        item_info = get_item_info(similar_item_id, styles_df)
+                        item_info = get_item_info(similar_item_id, catalog)
                         if item_info is not None:
                             recommendations_data.append({
                                 'Rank': i,
@@ -1590,7 +1604,7 @@ def get_collaborative_recommendations(selected_item_id, num_recommendations, mod
                                 
                                 with col:
                                     st.markdown('<div class="product-card">', unsafe_allow_html=True)
-                                    display_item_details(similar_item_id, styles_df, correlation_score, show_image=True, compact=True, is_collaborative=True)
+                                    display_item_details(similar_item_id, catalog, correlation_score, show_image=True, compact=True, is_collaborative=True)
                                     st.markdown(f"**Rank:** {i+j+1}")
                                     st.markdown('</div>', unsafe_allow_html=True)
                 
@@ -1601,7 +1615,7 @@ def get_collaborative_recommendations(selected_item_id, num_recommendations, mod
                     # Show calculations for all recommendations
                     for i, (similar_item_id, correlation_score) in enumerate(similar_items, 1):
                         with st.expander(f"🧮 Calculation #{i} - Correlation Score: {correlation_score:.4f}", expanded=(i==1)):
-                            show_correlation_calculation(selected_item_id, similar_item_id, correlation_score, model, styles_df)
+                            show_correlation_calculation(selected_item_id, similar_item_id, correlation_score, model, catalog)
                 
                 # Summary statistics in a clean card layout
                 st.markdown("### 📊 Correlation Statistics Summary")
@@ -1658,7 +1672,7 @@ def get_collaborative_recommendations(selected_item_id, num_recommendations, mod
             st.error(f"Error generating recommendations: {str(e)}")
             st.write(f"Debug: {str(e)}")
 
-def get_content_based_recommendations(selected_item_id, num_recommendations, model, styles_df):
+def get_content_based_recommendations(selected_item_id, num_recommendations, model, catalog):
     """Handle content-based recommendations"""
     with st.spinner("Calculating similarity scores and generating recommendations..."):
         try:
@@ -1672,7 +1686,7 @@ def get_content_based_recommendations(selected_item_id, num_recommendations, mod
                 st.markdown("### 📦 Selected Product")
                 with st.container():
                     st.markdown('<div class="product-card">', unsafe_allow_html=True)
-                    display_item_details(selected_item_id, styles_df)
+                    display_item_details(selected_item_id, catalog)
                     st.markdown('</div>', unsafe_allow_html=True)
                 
                 st.markdown("### 🎯 Recommendations with Similarity Analysis")
@@ -1716,7 +1730,7 @@ def get_content_based_recommendations(selected_item_id, num_recommendations, mod
                                 
                                 with col:
                                     st.markdown('<div class="product-card">', unsafe_allow_html=True)
-                                    display_item_details(similar_item_id, styles_df, similarity_score, show_image=True, compact=True)
+                                    display_item_details(similar_item_id, catalog, similarity_score, show_image=True, compact=True)
                                     st.markdown(f"**Rank:** {i+j+1}")
                                     st.markdown('</div>', unsafe_allow_html=True)
                 
@@ -1727,7 +1741,7 @@ def get_content_based_recommendations(selected_item_id, num_recommendations, mod
                     # Show calculations for all recommendations
                     for i, (similar_item_id, similarity_score) in enumerate(similar_items, 1):
                         with st.expander(f"🧮 Calculation #{i} - Similarity Score: {similarity_score:.4f}", expanded=(i==1)):
-                            show_similarity_calculation(selected_item_id, similar_item_id, similarity_score, model, styles_df)
+                            show_similarity_calculation(selected_item_id, similar_item_id, similarity_score, model, catalog)
                 
                 # Summary statistics in a clean card layout
                 st.markdown("### 📊 Similarity Statistics Summary")
@@ -1826,7 +1840,7 @@ def main():
         st.error("No models available! Please train at least one model first.")
         return
     
-    styles_df = load_styles_data()
+    catalog = load_item_catalog()
     
     # Create tabs for different recommendation types
     tab_names = []
@@ -1853,8 +1867,8 @@ def main():
     # Get items from collaborative model
     cf_items = set()
     if collaborative_model is not None:
-        if hasattr(collaborative_model, 'item_similarity_matrix') and collaborative_model.item_similarity_matrix is not None:
-            cf_items = set(collaborative_model.item_similarity_matrix.index)
+        if hasattr(collaborative_model, 'item_ids') and collaborative_model.item_ids is not None:
+            cf_items = set(collaborative_model.item_ids.tolist())
     
     # Get items from content-based model
     cb_items = set()
@@ -1876,8 +1890,8 @@ def main():
     unified_item_options = {}
     valid_cf_items = set()
     
-    if collaborative_model is not None and hasattr(collaborative_model, 'item_similarity_matrix'):
-        valid_cf_items = set(collaborative_model.item_similarity_matrix.index)
+    if collaborative_model is not None and hasattr(collaborative_model, 'item_ids'):
+        valid_cf_items = set(collaborative_model.item_ids.tolist())
     
     for item_id in common_items:
         # For collaborative filtering, only include items that exist in the similarity matrix
@@ -1885,18 +1899,13 @@ def main():
             continue
             
         # For collaborative filtering, also check if the item has sufficient similar items
-        if collaborative_model is not None and hasattr(collaborative_model, 'item_similarity_matrix'):
-            similarities = collaborative_model.item_similarity_matrix.loc[item_id]
-            similar_items_count = len(similarities[
-                (similarities.index != item_id) & 
-                (similarities > 0.0) &
-                (similarities < 1.0)  # Exclude perfect correlations
-            ])
+        if collaborative_model is not None and hasattr(collaborative_model, 'get_neighbor_count'):
+            similar_items_count = collaborative_model.get_neighbor_count(item_id)
             # Skip items with insufficient similar items (require at least 3)
             if similar_items_count < 3:
                 continue
             
-        item_info = get_item_info(item_id, styles_df)
+        item_info = get_item_info(item_id, catalog)
         if item_info is not None:
             product_name = item_info['productDisplayName']
             unified_item_options[f"{product_name} (ID: {item_id})"] = item_id
@@ -1934,7 +1943,7 @@ def main():
                     selected_item_id_cf = unified_item_options[selected_product_cf]
                     
                     if st.button("🚀 Get Recommendations", type="primary", key="cf_button_dropdown", use_container_width=True):
-                        get_collaborative_recommendations(selected_item_id_cf, 10, collaborative_model, styles_df)
+                        get_collaborative_recommendations(selected_item_id_cf, 10, collaborative_model, catalog)
                     st.markdown('</div>', unsafe_allow_html=True)
                 
                 else:  # Search Products
@@ -1951,7 +1960,7 @@ def main():
                         
                         # Show recommendations
                         st.markdown('</div>', unsafe_allow_html=True)  # Close search container
-                        get_collaborative_recommendations(selected_item_from_search, 10, collaborative_model, styles_df)
+                        get_collaborative_recommendations(selected_item_from_search, 10, collaborative_model, catalog)
                     else:
                         # Search functionality
                         search_query = st.text_input(
@@ -1967,7 +1976,7 @@ def main():
                             
                             for product_display, item_id in unified_item_options.items():
                                 # Get item details for more comprehensive search
-                                item_info = get_item_info(item_id, styles_df)
+                                item_info = get_item_info(item_id, catalog)
                                 if item_info:
                                     searchable_text = f"{item_info['productDisplayName']} {item_info.get('gender', '')} {item_info.get('masterCategory', '')} {item_info.get('subCategory', '')} {item_info.get('articleType', '')} {item_info.get('baseColour', '')} {item_info.get('season', '')} {item_info.get('usage', '')}".lower()
                                     
@@ -2047,7 +2056,7 @@ def main():
                     selected_item_id_cb = unified_item_options[selected_product_cb]
                     
                     if st.button("🚀 Get Recommendations", type="primary", key="cb_button_dropdown", use_container_width=True):
-                        get_content_based_recommendations(selected_item_id_cb, 10, content_based_model, styles_df)
+                        get_content_based_recommendations(selected_item_id_cb, 10, content_based_model, catalog)
                     st.markdown('</div>', unsafe_allow_html=True)
                 
                 else:  # Search Products
@@ -2064,7 +2073,7 @@ def main():
                         
                         # Show recommendations
                         st.markdown('</div>', unsafe_allow_html=True)  # Close search container
-                        get_content_based_recommendations(selected_item_from_cb_search, 10, content_based_model, styles_df)
+                        get_content_based_recommendations(selected_item_from_cb_search, 10, content_based_model, catalog)
                     else:
                         # Search functionality
                         search_query_cb = st.text_input(
@@ -2080,7 +2089,7 @@ def main():
                             
                             for product_display, item_id in unified_item_options.items():
                                 # Get item details for more comprehensive search
-                                item_info = get_item_info(item_id, styles_df)
+                                item_info = get_item_info(item_id, catalog)
                                 if item_info:
                                     searchable_text = f"{item_info['productDisplayName']} {item_info.get('gender', '')} {item_info.get('masterCategory', '')} {item_info.get('subCategory', '')} {item_info.get('articleType', '')} {item_info.get('baseColour', '')} {item_info.get('season', '')} {item_info.get('usage', '')}".lower()
                                     
@@ -2156,7 +2165,7 @@ def main():
                     st.markdown("### 📦 Selected Product for Comparison")
                     with st.container():
                         st.markdown('<div class="product-card">', unsafe_allow_html=True)
-                        display_item_details(selected_item_id_comp, styles_df)
+                        display_item_details(selected_item_id_comp, catalog)
                         st.markdown('</div>', unsafe_allow_html=True)
                     
                     st.markdown("---")
@@ -2216,7 +2225,7 @@ def main():
                                                     st.write("📷")
                                             
                                             with col_details:
-                                                item_info = get_item_info(similar_item_id, styles_df)
+                                                item_info = get_item_info(similar_item_id, catalog)
                                                 if item_info:
                                                     st.markdown(f"**{item_info['productDisplayName']}**")
                                                     st.caption(f"ID: {similar_item_id} | {item_info.get('gender', 'N/A')} | {item_info.get('articleType', 'N/A')}")
@@ -2297,13 +2306,13 @@ def main():
                             st.markdown("*Comprehensive evaluation of why each item was recommended by each approach*")
                             
                             # Get selected item info for comparison base
-                            selected_item_info = get_item_info(selected_item_id_comp, styles_df)
+                            selected_item_info = get_item_info(selected_item_id_comp, catalog)
                             
                             # Analyze Collaborative Filtering recommendations
                             st.markdown("##### 🔗 Collaborative Filtering Recommendations Analysis")
                             
                             for i, (similar_item_id, correlation_score) in enumerate(cf_similar_items[:5], 1):  # Top 5 for detailed analysis
-                                item_info = get_item_info(similar_item_id, styles_df)
+                                item_info = get_item_info(similar_item_id, catalog)
                                 if item_info:
                                     with st.expander(f"📋 CF Recommendation #{i}: {item_info['productDisplayName']} (Correlation: {correlation_score:.4f})", expanded=(i<=2)):
                                         col1, col2 = st.columns([1, 2])
@@ -2638,7 +2647,7 @@ def main():
                             if common_items:
                                 st.markdown("**Items Recommended by Both Approaches:**")
                                 for item_id in list(common_items)[:3]:  # Show first 3 common items
-                                    item_info = get_item_info(item_id, styles_df)
+                                    item_info = get_item_info(item_id, catalog)
                                     if item_info:
                                         st.write(f"• **{item_info['productDisplayName']}** (ID: {item_id})")
                         
@@ -3300,17 +3309,17 @@ def main():
                     if collaborative_model is not None and content_based_model is not None:
                         st.info("🔄 Evaluating both Collaborative Filtering and Content-Based models...")
                         evaluation_results = evaluate_recommendation_system(
-                            collaborative_model, content_based_model, styles_df, num_test_users
+                            collaborative_model, content_based_model, catalog, num_test_users
                         )
                     elif collaborative_model is not None:
                         st.info("🔄 Evaluating Collaborative Filtering model only...")
                         evaluation_results = evaluate_recommendation_system(
-                            collaborative_model, None, styles_df, num_test_users
+                            collaborative_model, None, catalog, num_test_users
                         )
                     elif content_based_model is not None:
                         st.info("🔄 Evaluating Content-Based model only...")
                         evaluation_results = evaluate_recommendation_system(
-                            None, content_based_model, styles_df, num_test_users
+                            None, content_based_model, catalog, num_test_users
                         )
                     
                     # Store results in session state
@@ -3950,7 +3959,7 @@ def visualize_metrics_comparison(cf_metrics, cb_metrics):
     
     st.dataframe(summary_df, use_container_width=True)
 
-def evaluate_recommendation_system(collaborative_model, content_based_model, styles_df, num_test_users=50):
+def evaluate_recommendation_system(collaborative_model, content_based_model, catalog, num_test_users=50):
     """
     CORRECT evaluation of recommendation systems using standard metrics:
     - Precision@K: Fraction of recommended items that are relevant
@@ -4049,11 +4058,10 @@ def evaluate_recommendation_system(collaborative_model, content_based_model, sty
         # Sample users for evaluation
         sample_users = np.random.choice(valid_users, min(num_test_users, len(valid_users)), replace=False)
         
-        progress_bar = st.progress(0)
-        
-        for idx, user_id in enumerate(sample_users):
-            progress_bar.progress((idx + 1) / len(sample_users))
-            
+        # Split every user's items into train/test first, so the content-based
+        # recommendations of all users can be scored in one batch
+        user_splits = []
+        for user_id in sample_users:
             # Get user's items
             user_items = user_ratings_filtered[user_ratings_filtered['user_id'] == user_id]
             
@@ -4068,6 +4076,29 @@ def evaluate_recommendation_system(collaborative_model, content_based_model, sty
             if len(relevant_test_items) == 0:
                 continue  # Skip users with no relevant test items
             
+            user_splits.append((train_items, relevant_test_items))
+        
+        # For content-based, recommend based on a random liked item of each user
+        base_recommendations = {}
+        if not is_collaborative:
+            base_items = {}
+            for idx, (train_items, _) in enumerate(user_splits):
+                liked_train_items = train_items[train_items['relevant'] == 1]['product_id'].tolist()
+                if not liked_train_items:
+                    continue
+                base_item = np.random.choice(liked_train_items)
+                if base_item in model.item_indices:
+                    base_items[idx] = base_item
+            
+            if base_items:
+                similar_lists = model.get_recommendations_batch(list(base_items.values()), K * 2)  # Get more to filter
+                base_recommendations = dict(zip(base_items, similar_lists))
+        
+        progress_bar = st.progress(0)
+        
+        for idx, (train_items, relevant_test_items) in enumerate(user_splits):
+            progress_bar.progress((idx + 1) / len(user_splits))
+            
             # Generate recommendations
             try:
                 if is_collaborative:
@@ -4091,14 +4122,10 @@ def evaluate_recommendation_system(collaborative_model, content_based_model, sty
                     recommended_items = [item_id for item_id, _ in recommendations]
                     
                 else:
-                    # For content-based, recommend based on user's preferred items
-                    liked_train_items = train_items[train_items['relevant'] == 1]['product_id'].tolist()
-                    if not liked_train_items:
+                    # Users without a liked item in the model have no base recommendations
+                    if idx not in base_recommendations:
                         continue
-                    
-                    # Get recommendations for a random liked item
-                    base_item = np.random.choice(liked_train_items)
-                    similar_items = model.get_recommendations(base_item, K * 2)  # Get more to filter
+                    similar_items = base_recommendations[idx]
                     
                     # Filter out training items
                     user_train_items = set(train_items['product_id'])
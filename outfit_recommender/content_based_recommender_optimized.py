@@ -1,14 +1,19 @@
 import pandas as pd
 import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.preprocessing import StandardScaler, LabelEncoder, OneHotEncoder
+from sklearn.preprocessing import StandardScaler, LabelEncoder, OneHotEncoder, normalize
 from sklearn.metrics.pairwise import cosine_similarity
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
 import pickle
 import os
+import time
+import multiprocessing
 from typing import List, Tuple, Dict, Optional
 from scipy.sparse import csr_matrix, save_npz, load_npz
+from item_catalog import ItemCatalog
+from instrumentation import profiled_phase, record_counts
+from ranking import top_k, top_k_agreement, top_k_per_row
 
 class OptimizedContentBasedRecommender:
     """
@@ -19,13 +24,28 @@ class OptimizedContentBasedRecommender:
     2. Using sparse matrices where possible
     3. Storing only essential data for recommendations
     4. Implementing efficient similarity computation
+    5. Storing the feature matrix in reduced precision (float32 by default)
+    6. Keeping an L2-normalized copy of the features, so cosine similarity is a
+       single sparse matrix-vector product
     """
     
-    def __init__(self, random_state: int = 42):
+    # Storage precisions for the feature matrix (scipy.sparse has no float16)
+    PRECISIONS = ('float64', 'float32')
+    
+    def __init__(self, random_state: int = 42, precision: str = 'float32', profiler=None):
+        if precision not in self.PRECISIONS:
+            raise ValueError(f"precision must be one of {self.PRECISIONS}, got {precision!r}")
         self.random_state = random_state
+        self.precision = precision
         self.data = None
         self.feature_matrix = None
+        self.normalized_features = None
         self.item_indices = None
+        self.catalog = None
+        self.categorical_codes = None
+        # Optional precomputed top-K table: catalog rows (int32) and scores (precision)
+        self.neighbor_indices = None
+        self.neighbor_scores = None
         self.preprocessor = None
         self.text_vectorizer = None
         self.is_fitted = False
@@ -34,7 +54,10 @@ class OptimizedContentBasedRecommender:
                                    'articleType', 'baseColour', 'season', 'usage']
         self.numerical_features = ['year']
         self.text_features = ['productDisplayName']
+        # Optional instrumentation.PhaseProfiler timing the training phases
+        self.profiler = profiler
         
+    @profiled_phase('load_data')
     def load_data(self, csv_path: str) -> pd.DataFrame:
         """
         Load and preprocess the fashion dataset.
@@ -77,10 +100,13 @@ class OptimizedContentBasedRecommender:
         })
         
         self.item_indices = {item_id: idx for idx, item_id in enumerate(self.data['id'])}
+        self.catalog = ItemCatalog(self.data)
         
         print(f"Loaded {len(self.data)} items")
+        record_counts(self, items=len(self.data))
         return self.data
         
+    @profiled_phase('preprocess_features')
     def _preprocess_features(self) -> csr_matrix:
         """
         Preprocess all features and combine them into a sparse feature matrix.
@@ -126,8 +152,11 @@ class OptimizedContentBasedRecommender:
         
         print(f"Feature matrix shape: {combined_features.shape}")
         print(f"Feature matrix sparsity: {1 - combined_features.nnz / (combined_features.shape[0] * combined_features.shape[1]):.4f}")
+        record_counts(self, items=combined_features.shape[0], features=combined_features.shape[1],
+                      nonzeros=combined_features.nnz)
         return combined_features
     
+    @profiled_phase('fit')
     def fit(self, csv_path: str) -> 'OptimizedContentBasedRecommender':
         """
         Fit the recommender system on the fashion dataset.
@@ -141,12 +170,40 @@ class OptimizedContentBasedRecommender:
 
         self.load_data(csv_path)
         
-        self.feature_matrix = self._preprocess_features()
+        self.feature_matrix = self._preprocess_features().tocsr().astype(self.precision)
+        self._normalize_features()
+        self._build_categorical_codes()
+        self.neighbor_indices = None
+        self.neighbor_scores = None
         
         self.is_fitted = True
+        record_counts(self, items=len(self.data))
         print("Optimized recommender system fitted successfully!")
         return self
     
+    def _normalize_features(self) -> None:
+        """
+        Store the feature matrix with L2-normalized rows (CSR, same precision), so
+        the cosine similarity of two items is the dot product of their rows.
+        """
+        self.normalized_features = normalize(self.feature_matrix, norm='l2').tocsr().astype(self.precision)
+        self.normalized_features.sort_indices()
+    
+    def _build_categorical_codes(self) -> None:
+        """
+        Keep the categorical features as an (n_items, n_features) int32 code
+        matrix, so items with identical categorical values are found with one
+        comparison. Missing values get code -1.
+        """
+        columns = []
+        for feature in self.categorical_features:
+            if feature in self.catalog.codes:
+                columns.append(self.catalog.codes[feature])
+            else:
+                codes, _ = pd.factorize(self.data[feature])
+                columns.append(codes.astype(np.int32))
+        self.categorical_codes = np.column_stack(columns)
+    
     def _compute_similarities(self, item_idx: int, n_recommendations: int = 10) -> np.ndarray:
         """
         Compute similarities for a specific item on-demand.
@@ -159,32 +216,75 @@ class OptimizedContentBasedRecommender:
             Array of similarity scores
         """
 
-        target_features = self.feature_matrix[item_idx:item_idx+1]
+        # Cosine similarity against every item as one sparse matrix-vector product
+        target_features = self.normalized_features[item_idx].toarray().ravel()
+        similarities = self.normalized_features @ target_features
+        
+        self._penalize_duplicates(self._similarity_operands(), similarities[np.newaxis], np.array([item_idx]))
+        return similarities
+    
+    def _similarity_operands(self) -> Dict:
+        """
+        Arrays needed to score query items against the catalog
+        """
+        return {
+            'features': self.normalized_features,
+            'codes': self.categorical_codes,
+            'ids': self.catalog.ids
+        }
+    
+    def _penalize_duplicates(self, operands: Dict, similarities: np.ndarray, query_rows: np.ndarray) -> None:
+        """
+        Apply penalty for items with identical categorical features but different IDs
+        to prevent 1.0000 scores for non-identical items (in place).
         
-        similarities = cosine_similarity(target_features, self.feature_matrix).flatten()
+        Args:
+            operands: Arrays from _similarity_operands
+            similarities: (n_queries, n_items) similarity block
+            query_rows: Catalog row of each query
+        """
+        # Only very high similarities are checked
+        rows, cols = np.nonzero(similarities > 0.99)
+        targets = query_rows[rows]
+        keep = (cols != targets) & (operands['ids'][cols] != operands['ids'][targets])
+        rows, cols, targets = rows[keep], cols[keep], targets[keep]
+        
+        # Missing values (code -1) never compare equal
+        codes = operands['codes']
+        identical = (codes[cols] == codes[targets]).all(axis=1) & (codes[targets] >= 0).all(axis=1)
+        rows, cols = rows[identical], cols[identical]
+        
+        # Cap at 0.99 and apply penalty
+        similarities[rows, cols] = np.minimum(0.99, similarities[rows, cols] * 0.95)
+    
+    def _recommend_block(self, operands: Dict, query_rows: np.ndarray, k: int) -> Tuple:
+        """
+        Score a block of query rows against the catalog with one sparse product
+        and keep the k best other items of each query, like get_recommendations.
         
-        # Apply penalty for items with identical categorical features but different IDs
-        # to prevent 1.0000 scores for non-identical items
-        target_item_id = self.data.iloc[item_idx]['id']
-        categorical_cols = ['gender', 'masterCategory', 'subCategory', 'articleType', 'baseColour', 'season', 'usage']
-        target_categorical = self.data.iloc[item_idx][categorical_cols].values
+        Returns:
+            Tuple of (result count per query, catalog rows, similarity scores)
+        """
+        features = operands['features']
+        queries = features[query_rows].toarray()
+        similarities = np.ascontiguousarray((features @ queries.T).T)
+        self._penalize_duplicates(operands, similarities, query_rows)
         
-        for i, similarity in enumerate(similarities):
-            if i != item_idx and similarity > 0.99:  # Only check very high similarities
-                item_id = self.data.iloc[i]['id']
-                item_categorical = self.data.iloc[i][categorical_cols].values
-                
-                # If categorical features are identical but IDs are different, apply penalty
-                if np.array_equal(target_categorical, item_categorical) and target_item_id != item_id:
-                    similarities[i] = min(0.99, similarity * 0.95)  # Cap at 0.99 and apply penalty
+        # The query item itself is never recommended
+        n_queries = similarities.shape[0]
+        similarities[np.arange(n_queries), query_rows] = -np.inf
         
-        return similarities
+        rows, cols = top_k_per_row(similarities, k)
+        return np.bincount(rows, minlength=n_queries), cols.astype(np.int32), similarities[rows, cols]
     
     def get_recommendations(self, item_id: int, n_recommendations: int = 10, 
                           include_similarity_scores: bool = True) -> List[Dict]:
         """
         Get recommendations for a specific item.
         
+        Served from the precomputed neighbor table when it holds at least
+        n_recommendations neighbors, otherwise scored on demand.
+        
         Args:
             item_id: ID of the item to get recommendations for
             n_recommendations: Number of recommendations to return
@@ -201,42 +301,189 @@ class OptimizedContentBasedRecommender:
         
         item_idx = self.item_indices[item_id]
         
+        if self._has_neighbors(n_recommendations):
+            return self._format_recommendations(self.neighbor_indices[item_idx, :n_recommendations],
+                                                self.neighbor_scores[item_idx, :n_recommendations],
+                                                include_similarity_scores)
+        
         similarities = self._compute_similarities(item_idx, n_recommendations + 1)
         
-        # Get all indices sorted by similarity (excluding the item itself)
-        all_indices = np.argsort(similarities)[::-1]
+        # Top N recommendations, excluding the input item itself
+        similarities[item_idx] = -np.inf
+        similar_indices = top_k(similarities, n_recommendations)
+        
+        return self._format_recommendations(similar_indices, similarities[similar_indices],
+                                            include_similarity_scores)
+    
+    def _format_recommendations(self, rows: np.ndarray, scores: np.ndarray,
+                                include_similarity_scores: bool = True) -> List[Dict]:
+        """
+        Build result dictionaries for catalog rows and their similarity scores.
         
-        # Filter out the input item itself and get top N recommendations
-        similar_indices = []
-        for idx in all_indices:
-            if idx != item_idx:  # Exclude the input item itself
-                similar_indices.append(idx)
-                if len(similar_indices) >= n_recommendations:
-                    break
+        Catalog rows are the data rows, so the details come straight from its arrays.
+        """
+        detail_columns = ['id', 'productDisplayName', 'gender', 'masterCategory', 'subCategory',
+                          'articleType', 'baseColour', 'season', 'usage', 'year']
+        details = {column: self.catalog.column(column, rows).tolist() for column in detail_columns}
+        scores = np.asarray(scores).tolist()
         
         recommendations = []
-        for idx in similar_indices:
-            item_data = self.data.iloc[idx]
-            rec = {
-                'id': int(item_data['id']),
-                'productDisplayName': item_data['productDisplayName'],
-                'gender': item_data['gender'],
-                'masterCategory': item_data['masterCategory'],
-                'subCategory': item_data['subCategory'],
-                'articleType': item_data['articleType'],
-                'baseColour': item_data['baseColour'],
-                'season': item_data['season'],
-                'usage': item_data['usage'],
-                'year': int(item_data['year'])
-            }
+        for position in range(len(rows)):
+            rec = {column: details[column][position] for column in detail_columns}
+            rec['id'] = int(rec['id'])
+            rec['year'] = int(rec['year'])
             
             if include_similarity_scores:
-                rec['similarity_score'] = float(similarities[idx])
+                rec['similarity_score'] = float(scores[position])
             
             recommendations.append(rec)
         
         return recommendations
     
+    def get_recommendations_batch(self, item_ids: List[int], n_recommendations: int = 10,
+                                  include_similarity_scores: bool = True, block_size: int = 1024,
+                                  n_jobs: int = 1, max_block_bytes: int = 512 * 1024**2) -> List[List[Dict]]:
+        """
+        Get recommendations for many items at once.
+        
+        Query items are scored in blocks of block_size with one sparse product
+        against the catalog each (block_size x n_items similarities in memory), and
+        with n_jobs > 1 (or -1 for all cores) the blocks are spread over a process
+        pool; blocks and workers are reduced to fit max_block_bytes (see
+        _iter_recommend_blocks). Each item gets the same recommendations as
+        get_recommendations (from the precomputed neighbor table when it is deep
+        enough).
+        
+        Args:
+            item_ids: IDs of the items to get recommendations for
+            n_recommendations: Number of recommendations per item
+            include_similarity_scores: Whether to include similarity scores
+            block_size: Largest number of query items scored together
+            n_jobs: Number of worker processes
+            max_block_bytes: Memory budget of all blocks scored at the same time
+            
+        Returns:
+            List of recommendation lists, aligned with item_ids
+        """
+        if not self.is_fitted:
+            raise ValueError("Recommender must be fitted before making recommendations")
+        
+        missing = [item_id for item_id in item_ids if item_id not in self.item_indices]
+        if missing:
+            raise ValueError(f"Item IDs {missing[:10]} not found in dataset")
+        
+        query_rows = np.array([self.item_indices[item_id] for item_id in item_ids], dtype=np.int64)
+        if self._has_neighbors(n_recommendations):
+            return [self._format_recommendations(self.neighbor_indices[row, :n_recommendations],
+                                                 self.neighbor_scores[row, :n_recommendations],
+                                                 include_similarity_scores) for row in query_rows]
+        
+        results = []
+        for counts, rows, scores in self._iter_recommend_blocks(query_rows, n_recommendations, block_size, n_jobs,
+                                                                max_block_bytes):
+            ends = np.cumsum(counts)
+            for start, end in zip(ends - counts, ends):
+                results.append(self._format_recommendations(rows[start:end], scores[start:end],
+                                                            include_similarity_scores))
+        return results
+    
+    def _block_bytes_per_query(self) -> int:
+        """
+        Peak bytes a block of _recommend_block needs per query: the dense query
+        features, the similarity row with its transposed copy and partition copy,
+        and the boolean masks over it
+        """
+        n_items, n_features = self.normalized_features.shape
+        itemsize = self.normalized_features.dtype.itemsize
+        return n_items * (3 * itemsize + 2) + n_features * itemsize
+    
+    def _iter_recommend_blocks(self, query_rows: np.ndarray, k: int, block_size: int, n_jobs: int,
+                               max_block_bytes: int = 512 * 1024**2):
+        """
+        Yield the _recommend_block results of consecutive blocks of query rows,
+        computed in this process or, with n_jobs > 1 (-1 for all cores), in a
+        process pool that receives the similarity operands once.
+        
+        Every worker holds a copy of the operands and one block, so the number of
+        workers and then block_size are reduced until all of them fit in
+        max_block_bytes.
+        """
+        if n_jobs is None or n_jobs < 1:
+            n_jobs = os.cpu_count() or 1
+        operands = self._similarity_operands()
+        query_bytes = self._block_bytes_per_query()
+        worker_budget = max_block_bytes
+        if n_jobs > 1:
+            operand_bytes = sum(np.asarray(array).nbytes for array in [
+                operands['features'].data, operands['features'].indices, operands['features'].indptr,
+                operands['codes'], operands['ids']
+            ])
+            n_jobs = max(min(n_jobs, max_block_bytes // (operand_bytes + query_bytes)), 1)
+            if n_jobs > 1:
+                worker_budget = max_block_bytes // n_jobs - operand_bytes
+        block_size = max(min(block_size, worker_budget // query_bytes), 1)
+        
+        blocks = [query_rows[start:start + block_size] for start in range(0, len(query_rows), block_size)]
+        n_jobs = min(n_jobs, max(len(blocks), 1))
+        
+        if n_jobs <= 1:
+            for rows in blocks:
+                yield self._recommend_block(operands, rows, k)
+            return
+        
+        pool = multiprocessing.Pool(n_jobs, initializer=_attach_content_operands, initargs=(operands,))
+        try:
+            yield from pool.imap(_compute_content_block, [(rows, k) for rows in blocks])
+        finally:
+            pool.close()
+            pool.join()
+    
+    @profiled_phase('precompute_neighbors')
+    def precompute_neighbors(self, k: int = 50, block_size: int = 1024, n_jobs: int = 1,
+                             max_block_bytes: int = 512 * 1024**2) -> None:
+        """
+        Precompute every item's top-k recommendations, so that requests for up to
+        k recommendations are served without scoring the catalog.
+        
+        The table holds each item's neighbor catalog rows (int32) and similarity
+        scores (in the model's precision) as (n_items, k) arrays; it is saved with
+        the model and dropped when the model is refitted. Workers and blocks are
+        reduced to fit max_block_bytes, so n_jobs=-1 is safe on large catalogs.
+        
+        Args:
+            k: Number of neighbors kept per item (at most n_items - 1)
+            block_size: Largest number of items scored together
+            n_jobs: Number of worker processes (-1 for all cores)
+            max_block_bytes: Memory budget of all blocks scored at the same time
+        """
+        if not self.is_fitted:
+            raise ValueError("Recommender must be fitted before precomputing neighbors")
+        
+        n_items = len(self.data)
+        k = min(k, n_items - 1)
+        print(f"Precomputing top-{k} neighbors for {n_items} items...")
+        
+        indices = np.empty((n_items, k), dtype=np.int32)
+        scores = np.empty((n_items, k), dtype=self.precision)
+        start = 0
+        for counts, rows, block_scores in self._iter_recommend_blocks(np.arange(n_items), k, block_size, n_jobs,
+                                                                      max_block_bytes):
+            stop = start + len(counts)
+            indices[start:stop] = rows.reshape(len(counts), k)
+            scores[start:stop] = block_scores.reshape(len(counts), k)
+            start = stop
+        
+        self.neighbor_indices = indices
+        self.neighbor_scores = scores
+        record_counts(self, items=n_items, neighbors=k, bytes=indices.nbytes + scores.nbytes)
+        print(f"Neighbor table completed! {(indices.nbytes + scores.nbytes) / 1024**2:.1f} MB")
+    
+    def _has_neighbors(self, n_recommendations: int) -> bool:
+        """
+        Whether the precomputed neighbor table can serve n_recommendations
+        """
+        return self.neighbor_indices is not None and n_recommendations <= self.neighbor_indices.shape[1]
+    
     def get_item_details(self, item_id: int) -> Dict:
         """
         Get detailed information about a specific item.
@@ -250,8 +497,7 @@ class OptimizedContentBasedRecommender:
         if item_id not in self.item_indices:
             raise ValueError(f"Item ID {item_id} not found in dataset")
         
-        item_data = self.data[self.data['id'] == item_id].iloc[0]
-        return item_data.to_dict()
+        return self.catalog.get(item_id)
     
     def find_similar_by_features(self, gender: str = None, master_category: str = None,
                                 sub_category: str = None, article_type: str = None,
@@ -312,6 +558,7 @@ class OptimizedContentBasedRecommender:
         
         return results
     
+    @profiled_phase('save_model')
     def save_model(self, filepath: str) -> None:
         """
         Save the fitted recommender model to disk (single file optimized version).
@@ -332,7 +579,10 @@ class OptimizedContentBasedRecommender:
             'categorical_features': self.categorical_features,
             'numerical_features': self.numerical_features,
             'text_features': self.text_features,
-            'feature_matrix': self.feature_matrix 
+            'precision': self.precision,
+            'feature_matrix': self.feature_matrix,
+            'neighbor_indices': self.neighbor_indices,
+            'neighbor_scores': self.neighbor_scores
         }
         
         with open(filepath, 'wb') as f:
@@ -342,6 +592,7 @@ class OptimizedContentBasedRecommender:
         
         file_size = os.path.getsize(filepath) / (1024 * 1024)  # MB
         print(f"Model file size: {file_size:.2f} MB")
+        record_counts(self, items=len(self.data), bytes=os.path.getsize(filepath))
     
     def load_model(self, filepath: str) -> 'OptimizedContentBasedRecommender':
         """
@@ -363,6 +614,10 @@ class OptimizedContentBasedRecommender:
         self.categorical_features = model_data['categorical_features']
         self.numerical_features = model_data['numerical_features']
         self.text_features = model_data['text_features']
+        self.catalog = ItemCatalog(self.data)
+        self._build_categorical_codes()
+        # Older model files store float64 features
+        self.precision = model_data.get('precision', 'float64')
         
         if 'feature_matrix' in model_data:
             self.feature_matrix = model_data['feature_matrix']
@@ -375,6 +630,10 @@ class OptimizedContentBasedRecommender:
                 else:
                     feature_matrix_path = filepath.replace('_optimized.pkl', '_features.npz').replace('.pkl', '_features.npz')
             self.feature_matrix = load_npz(feature_matrix_path)
+        self._normalize_features()
+        # Older model files have no neighbor table
+        self.neighbor_indices = model_data.get('neighbor_indices')
+        self.neighbor_scores = model_data.get('neighbor_scores')
         
         self.is_fitted = True
         
@@ -467,6 +726,23 @@ class OptimizedContentBasedRecommender:
             "memory_usage_mb": self.data.memory_usage(deep=True).sum() / 1024 / 1024
         }
 
+# Similarity operands of the batch recommendation worker processes
+_worker_operands = None
+
+def _attach_content_operands(operands):
+    """
+    Pool initializer: keep the similarity operands in the worker process
+    """
+    global _worker_operands
+    _worker_operands = operands
+
+def _compute_content_block(task):
+    """
+    Pool task: recommend for one block of query rows
+    """
+    rows, k = task
+    return OptimizedContentBasedRecommender()._recommend_block(_worker_operands, rows, k)
+
 def test_optimized_recommender(csv_path: str):
     """
     Test the optimized recommender system.
@@ -505,6 +781,85 @@ def test_optimized_recommender(csv_path: str):
     for i, rec in enumerate(test_recommendations, 1):
         print(f"  {i}. {rec['productDisplayName']} (ID: {rec['id']})")
 
+def test_precision_agreement(csv_path: str, n_items: int = 100, n_recommendations: int = 10,
+                             tolerance: float = 1e-4) -> Dict:
+    """
+    Compare recommendations from a float32 feature matrix with float64.
+    
+    Items with equal scores can swap places, so agreement is also measured up
+    to ties with the float64 scores (see ranking.top_k_agreement).
+    
+    Args:
+        csv_path: Path to the CSV file
+        n_items: Number of query items compared
+        n_recommendations: Number of recommendations per query item
+        tolerance: Score difference treated as a tie
+        
+    Returns:
+        Dictionary of agreement statistics
+    """
+    print("Testing reduced-precision feature matrix")
+    print("=" * 50)
+    
+    reference = OptimizedContentBasedRecommender(precision='float64').fit(csv_path)
+    recommender = OptimizedContentBasedRecommender(precision='float32').fit(csv_path)
+    
+    item_ids = reference.data['id'].iloc[:n_items]
+    
+    def recommended_positions(model):
+        return [[reference.item_indices[rec['id']] for rec in model.get_recommendations(item_id, n_recommendations)]
+                for item_id in item_ids]
+    
+    reference_scores = [reference._compute_similarities(reference.item_indices[item_id]) for item_id in item_ids]
+    results = {
+        'feature_bytes': recommender.feature_matrix.data.nbytes,
+        'reduction': reference.feature_matrix.data.nbytes / max(recommender.feature_matrix.data.nbytes, 1),
+        **top_k_agreement(recommended_positions(reference), recommended_positions(recommender),
+                          reference_scores, tolerance)
+    }
+    print(f"float32: {results['reduction']:.0f}x smaller feature values, top-{n_recommendations} overlap "
+          f"{results['overlap']:.2%}, agreement up to ties {results['agreement']:.2%}")
+    return results
+
+def benchmark_similarity_latency(csv_path: str, n_queries: int = 200) -> Dict:
+    """
+    Compare the per-query latency of sklearn cosine_similarity on the raw
+    feature matrix with the product against the pre-normalized features.
+    
+    Args:
+        csv_path: Path to the CSV file
+        n_queries: Number of query items timed
+        
+    Returns:
+        Dictionary with milliseconds per query of both paths, the speedup and
+        the largest score difference
+    """
+    print("Benchmarking content-based similarity latency")
+    print("=" * 50)
+    
+    recommender = OptimizedContentBasedRecommender().fit(csv_path)
+    queries = np.arange(min(n_queries, len(recommender.data)))
+    
+    start = time.perf_counter()
+    reference = [cosine_similarity(recommender.feature_matrix[idx:idx+1], recommender.feature_matrix).ravel()
+                 for idx in queries]
+    sklearn_ms = (time.perf_counter() - start) / len(queries) * 1000
+    
+    start = time.perf_counter()
+    products = [recommender.normalized_features @ recommender.normalized_features[idx].toarray().ravel()
+                for idx in queries]
+    normalized_ms = (time.perf_counter() - start) / len(queries) * 1000
+    
+    results = {
+        'sklearn_ms': sklearn_ms,
+        'normalized_ms': normalized_ms,
+        'speedup': sklearn_ms / normalized_ms if normalized_ms > 0 else float('inf'),
+        'max_difference': float(max(np.abs(a - b).max() for a, b in zip(reference, products)))
+    }
+    print(f"cosine_similarity: {sklearn_ms:.3f} ms/query, pre-normalized product: {normalized_ms:.3f} ms/query "
+          f"({results['speedup']:.1f}x faster, max difference {results['max_difference']:.2e})")
+    return results
+
 if __name__ == "__main__":
     csv_path = "data/styles.csv"
     if os.path.exists(csv_path):
@@ -0,0 +1,187 @@
+import os
+import time
+import tempfile
+import numpy as np
+import pandas as pd
+from scored_recommender import ScoredRecommender
+from ranking import top_k
+from item_based_cf import ItemBasedCollaborativeFiltering
+from instrumentation import profiled_phase, record_counts
+
+class EASERecommender(ScoredRecommender):
+    """
+    EASE (Embarrassingly Shallow Autoencoder) item model trained in closed form
+    
+    The item-item weight matrix B minimizes ||X - X B||^2 + regularization * ||B||^2
+    with a zero diagonal, where X is the binary user-item matrix of who rated what.
+    Its solution needs a single inversion of the item Gram matrix:
+    P = (X^T X + regularization * I)^-1 and B = -P / diag(P) off the diagonal.
+    A user's scores are X_u B, so all users are scored with dense BLAS products.
+    
+    B is dense (n_items x n_items float32), which suits catalogs up to ~20k items;
+    train() keeps the 20k most rated items by default.
+    """
+    
+    MODEL_NAME = "EASE Item Model"
+    MODEL_FORMAT = 'ease'
+    MODEL_ARRAYS = ('weights',)
+    MODEL_FIELDS = ('regularization',)
+    
+    def __init__(self, regularization=500.0, profiler=None):
+        """
+        Args:
+            regularization: L2 penalty added to the diagonal of the Gram matrix
+            profiler: Optional PhaseProfiler recording the training phases
+        """
+        super().__init__(profiler=profiler)
+        self.regularization = regularization
+        self.weights = None
+    
+    @profiled_phase('fit_weights')
+    def fit(self):
+        """
+        Compute the item weight matrix from the loaded rating matrix
+        """
+        if self.user_item_matrix is None:
+            raise ValueError("No ratings loaded. Call load_data() first.")
+        n_items = len(self.item_ids)
+        print(f"Fitting EASE model on {n_items} items...")
+        
+        rated = self.user_item_matrix.copy()
+        rated.data = np.ones_like(rated.data, dtype=np.float64)
+        gram = (rated.T @ rated).toarray()
+        diagonal = np.arange(n_items)
+        gram[diagonal, diagonal] += self.regularization
+        
+        inverse = np.linalg.inv(gram)
+        weights = inverse / -np.diag(inverse)
+        weights[diagonal, diagonal] = 0.0
+        self.weights = weights.astype(np.float32)
+        
+        self._compute_item_means()
+        record_counts(self, items=n_items, weight_bytes=self.weights.nbytes)
+        print(f"EASE model completed! {n_items} x {n_items} weight matrix "
+              f"({self.weights.nbytes / 1024**2:.1f} MB)")
+        return self
+    
+    def train(self, ratings_path, styles_path, sample_size=None, use_enhanced_dataset=True, max_items=20000):
+        """
+        Complete training pipeline, keeping the max_items most rated items so the
+        dense weight matrix stays tractable
+        """
+        return super().train(ratings_path, styles_path, sample_size, use_enhanced_dataset, max_items=max_items)
+    
+    def _score_users(self, user_rows):
+        """
+        EASE scores of a block of users for every item (float32, users x items)
+        """
+        rated = self.user_item_matrix[user_rows]
+        rated = rated.astype(np.float32)
+        rated.data[:] = 1.0
+        return np.asarray(rated @ np.asarray(self.weights), dtype=np.float32)
+    
+    def _predict_known_rating(self, user_id, item_id, k=10):
+        """
+        EASE score of a user-item pair (a ranking score, not a rating; k is ignored)
+        """
+        self._check_fitted()
+        return float(self._score_users([self.user_index[user_id]])[0, self.item_index[item_id]])
+    
+    def find_similar_items(self, item_id, n_similar=10):
+        """
+        Find the items the given item most strongly predicts (its row of the weight matrix)
+        Returns list of tuples: [(item_id, weight), ...]
+        Returns items sorted by weight (highest first), positive weights only
+        """
+        if not self.has_item(item_id):
+            return []
+        
+        self._check_fitted()
+        weights = np.asarray(self.weights[self.item_index[item_id]])
+        candidates = np.flatnonzero(weights > 0)
+        top = candidates[top_k(weights[candidates], n_similar)]
+        
+        return [(item_id, float(weight)) for item_id, weight in zip(self.item_ids[top].tolist(), weights[top])]
+    
+    def get_neighbor_count(self, item_id):
+        """
+        Number of items with a positive weight in the item's row
+        """
+        if not self.has_item(item_id) or self.weights is None:
+            return 0
+        return int((np.asarray(self.weights[self.item_index[item_id]]) > 0).sum())
+
+def _precision_at_n(recommendations, held_out, n):
+    """
+    Mean share of each evaluated user's top-n recommendations found in the
+    user's held-out items
+    
+    Args:
+        recommendations: Structured array from recommend_batch
+        held_out: DataFrame of held-out (user_id, product_id) pairs
+        n: Cutoff of the precision
+    """
+    recommended = pd.DataFrame({'user_id': recommendations['user_id'], 'product_id': recommendations['item_id']})
+    hits = recommended.merge(held_out[['user_id', 'product_id']], on=['user_id', 'product_id'])
+    hits_per_user = hits.groupby('user_id').size().reindex(held_out['user_id'].unique(), fill_value=0)
+    return float((hits_per_user / n).mean())
+
+def benchmark_ease_vs_pearson(ratings_path="data/user_ratings.csv", styles_path="data/styles.csv",
+                              test_fraction=0.2, n=10, regularization=500.0, n_jobs=1, random_state=42):
+    """
+    Compare EASE with the item-based Pearson model on a per-user holdout
+    
+    A random test_fraction of every user's rated items (duplicate ratings of a
+    pair collapsed to the last one) is held out; both models are trained on the
+    rest and recommend n unseen items to every user with held-out items.
+    
+    Args:
+        ratings_path: Ratings CSV file
+        styles_path: Item metadata CSV file
+        test_fraction: Share of each user's items held out
+        n: Number of recommendations per user (Precision@n)
+        regularization: EASE regularization
+        n_jobs: Worker processes for the Pearson similarity build
+        random_state: Seed of the holdout split
+    
+    Returns:
+        Dictionary mapping model name to training seconds and Precision@n
+    """
+    print("Benchmarking EASE against item-based Pearson")
+    print("=" * 50)
+    
+    ratings = pd.read_csv(ratings_path, usecols=['user_id', 'product_id', 'rating'])
+    ratings = ratings.drop_duplicates(['user_id', 'product_id'], keep='last')
+    rng = np.random.RandomState(random_state)
+    held_out_mask = rng.random_sample(len(ratings)) < test_fraction
+    train_ratings, held_out = ratings[~held_out_mask], ratings[held_out_mask]
+    held_out = held_out[held_out['user_id'].isin(train_ratings['user_id'])]
+    print(f"{len(train_ratings)} training ratings, {len(held_out)} held out for "
+          f"{held_out['user_id'].nunique()} users")
+    
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        train_path = os.path.join(directory, 'train_ratings.csv')
+        train_ratings.to_csv(train_path, index=False)
+        
+        models = [
+            ('pearson', ItemBasedCollaborativeFiltering(),
+             lambda model: model.build_item_similarity_matrix(n_jobs=n_jobs)),
+            ('ease', EASERecommender(regularization=regularization), lambda model: model.fit())
+        ]
+        for name, model, fit in models:
+            model.load_data(train_path, styles_path)
+            start = time.perf_counter()
+            fit(model)
+            training_time = time.perf_counter() - start
+            
+            recommendations = model.recommend_batch(held_out['user_id'].unique(), n=n)
+            results[name] = {
+                'training_time': training_time,
+                f'precision_at_{n}': _precision_at_n(recommendations, held_out, n)
+            }
+    
+    print(f"\n{'Model':<10} {'Training (s)':>13} {'Precision@' + str(n):>13}")
+    for name, result in results.items():
+        print(f"{name:<10} {result['training_time']:>13.2f} {result[f'precision_at_{n}']:>13.4f}")
+    return results
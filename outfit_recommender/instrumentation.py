@@ -0,0 +1,143 @@
+import json
+import os
+import time
+import tracemalloc
+import functools
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+class PhaseProfiler:
+    """
+    Records wall time, CPU time, tracemalloc peak and item/pair counts for
+    named training phases, and writes them as JSON so runs can be compared.
+    
+    Phases can be nested; each record keeps the name of its parent phase and
+    the peak of a parent phase includes the peaks of its children.
+    """
+    
+    def __init__(self, trace_memory: bool = True):
+        """
+        Args:
+            trace_memory: Track the allocation peak of each phase with tracemalloc
+        """
+        self.trace_memory = trace_memory
+        self.phases = []
+        self._stack = []
+        self._started_tracing = False
+    
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Context manager measuring one phase; yields the phase record so counts
+        can be added with record['counts'][...] or add_counts().
+        """
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        
+        record = {
+            'name': name,
+            'parent': self._stack[-1]['record']['name'] if self._stack else None,
+            'started_at': datetime.now().isoformat(),
+            'counts': {}
+        }
+        frame = {'record': record, 'peak': 0}
+        if self.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                self._stack[-1]['peak'] = max(self._stack[-1]['peak'], peak)
+            tracemalloc.reset_peak()
+            record['memory_start_mb'] = current / 1024**2
+        
+        self._stack.append(frame)
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield record
+        finally:
+            record['wall_time'] = time.perf_counter() - wall_start
+            record['cpu_time'] = time.process_time() - cpu_start
+            self._stack.pop()
+            if self.trace_memory:
+                current, peak = tracemalloc.get_traced_memory()
+                peak = max(frame['peak'], peak)
+                record['memory_end_mb'] = current / 1024**2
+                record['tracemalloc_peak_mb'] = peak / 1024**2
+                if self._stack:
+                    self._stack[-1]['peak'] = max(self._stack[-1]['peak'], peak)
+            if resource is not None:
+                # Process-wide high-water mark (kilobytes on Linux)
+                record['max_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            self.phases.append(record)
+            if self._started_tracing and not self._stack:
+                tracemalloc.stop()
+                self._started_tracing = False
+    
+    def add_counts(self, **counts):
+        """
+        Add item/pair counts to the innermost running phase
+        """
+        if self._stack:
+            self._stack[-1]['record']['counts'].update(
+                {key: int(value) for key, value in counts.items()}
+            )
+    
+    def to_dict(self) -> dict:
+        return {
+            'created_at': datetime.now().isoformat(),
+            'trace_memory': self.trace_memory,
+            'phases': self.phases
+        }
+    
+    def save(self, path: str) -> None:
+        """
+        Write the recorded phases as JSON
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        print(f"Training profile saved to {path}")
+    
+    def print_summary(self) -> None:
+        """
+        Print one line per phase in completion order
+        """
+        print("\nTraining phases:")
+        for record in self.phases:
+            line = f"- {record['name']}: {record['wall_time']:.2f}s wall, {record['cpu_time']:.2f}s CPU"
+            if 'tracemalloc_peak_mb' in record:
+                line += f", peak {record['tracemalloc_peak_mb']:.1f} MB"
+            if record['counts']:
+                line += ", " + ", ".join(f"{key}={value:,}" for key, value in record['counts'].items())
+            print(line)
+
+def profiled_phase(name: str):
+    """
+    Method decorator that runs the method as a phase of the instance's
+    profiler attribute (no-op when the instance has no profiler).
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            profiler = getattr(self, 'profiler', None)
+            if profiler is None:
+                return method(self, *args, **kwargs)
+            with profiler.phase(name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+def record_counts(owner, **counts):
+    """
+    Add counts to the running phase of owner's profiler, if it has one
+    """
+    profiler = getattr(owner, 'profiler', None)
+    if profiler is not None:
+        profiler.add_counts(**counts)
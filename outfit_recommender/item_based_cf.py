@@ -2,70 +2,77 @@ import pandas as pd
 import numpy as np
 from scipy.stats import pearsonr
 import pickle
+import json
 import os
-from sklearn.metrics.pairwise import cosine_similarity
+import hashlib
+import time
+import multiprocessing
+from multiprocessing import shared_memory
 from collections import defaultdict
+from scipy.sparse import csr_matrix, csc_matrix, vstack
+from instrumentation import profiled_phase, record_counts
+from rating_recommender import RatingRecommender, _IdIndex, _RecommendationWriter
+from ranking import top_k, top_k_agreement, top_k_per_row
 import warnings
 warnings.filterwarnings('ignore')
 
-class ItemBasedCollaborativeFiltering:
-    def __init__(self):
-        self.item_similarity_matrix = None
-        self.user_item_matrix = None
-        self.item_means = None
-        self.items_data = None
-        
-    def load_data(self, ratings_path, styles_path, sample_size=50000):
-        """
-        Load and preprocess the ratings and styles data
-        """
-        print("Loading data...")
-        
-        # Load ratings data
-        self.ratings_df = pd.read_csv(ratings_path)
-        print(f"Loaded {len(self.ratings_df)} ratings")
-        
-        # Sample data if too large to avoid memory issues
-        if len(self.ratings_df) > sample_size:
-            print(f"Sampling {sample_size} ratings for training...")
-            self.ratings_df = self.ratings_df.sample(n=sample_size, random_state=42)
-        
-        # Load styles data
-        self.styles_df = pd.read_csv(styles_path)
-        print(f"Loaded {len(self.styles_df)} items")
-        
-        # Get unique users and items from sampled data
-        unique_users = self.ratings_df['user_id'].unique()
-        unique_items = self.ratings_df['product_id'].unique()
-        
-        print(f"Working with {len(unique_users)} users and {len(unique_items)} items")
-        
-        # Create user-item matrix with sampled data
-        try:
-            self.user_item_matrix = self.ratings_df.pivot_table(
-                index='user_id', 
-                columns='product_id', 
-                values='rating', 
-                fill_value=0
-            )
-            print(f"User-item matrix shape: {self.user_item_matrix.shape}")
-        except Exception as e:
-            print(f"Error creating pivot table: {e}")
-            # Fallback: create a smaller sample
-            print("Using smaller sample...")
-            small_sample = self.ratings_df.sample(n=min(10000, len(self.ratings_df)), random_state=42)
-            self.user_item_matrix = small_sample.pivot_table(
-                index='user_id', 
-                columns='product_id', 
-                values='rating', 
-                fill_value=0
-            )
-            print(f"Reduced user-item matrix shape: {self.user_item_matrix.shape}")
-        
-        # Store items data for recommendations
-        self.items_data = self.styles_df.set_index('id')
-        
-        return self
+class ItemBasedCollaborativeFiltering(RatingRecommender):
+    MODEL_NAME = "Item-Based Collaborative Filtering Model"
+    
+    # Per item-pair sufficient statistics of the co-rated Pearson correlation
+    PAIR_STATISTICS = ['count', 'sum_x', 'sum_y', 'sum_xx', 'sum_yy', 'sum_xy']
+    
+    # Metadata attributes and the similarity weight of a match, in scoring order
+    METADATA_WEIGHTS = [
+        ('masterCategory', 0.4),
+        ('subCategory', 0.3),
+        ('articleType', 0.2),
+        ('gender', 0.1),
+        ('season', 0.05),
+        ('usage', 0.05),
+        ('baseColour', 0.1)
+    ]
+    
+    # Vectorized similarity kernels: name -> method computing a CSR block of
+    # similarities between items[start:stop] and all items from the rating operands
+    SIMILARITY_KERNELS = {
+        'pearson': '_pearson_similarity_block',
+        'adjusted_cosine': '_adjusted_cosine_similarity_block',
+        'cosine': '_cosine_similarity_block',
+        'jaccard': '_jaccard_similarity_block'
+    }
+    
+    # Storage precisions for the neighbor scores; int8 stores round(score / INT8_SCORE_SCALE)
+    PRECISIONS = ('float64', 'float32', 'float16', 'int8')
+    INT8_SCORE_SCALE = 1.0 / 127
+    
+    # Version of the similarity build checkpoint manifest
+    CHECKPOINT_VERSION = 1
+    
+    # Peak bytes per (user, item) pair of a recommend_batch block: the dense
+    # float64 sums, predictions and partition copy plus their boolean masks
+    BATCH_BYTES_PER_PAIR = 48
+    
+    def __init__(self, precision='float32', profiler=None):
+        if precision not in self.PRECISIONS:
+            raise ValueError(f"precision must be one of {self.PRECISIONS}, got {precision!r}")
+        super().__init__(profiler=profiler)
+        # Storage precision of the neighbor scores (int8 scores are multiples of score_scale)
+        self.precision = precision
+        self.score_scale = self.INT8_SCORE_SCALE if precision == 'int8' else None
+        # Top-K neighbor index (CSR layout): the neighbors of item_ids[i] are
+        # neighbor_indices[neighbor_indptr[i]:neighbor_indptr[i+1]], sorted by score
+        self.neighbor_indptr = None
+        self.neighbor_indices = None
+        self.neighbor_scores = None
+        # Item of every entry and, per item, the entries listing it as a neighbor
+        self.neighbor_rows = None
+        self.reverse_indptr = None
+        self.reverse_entries = None
+        self.n_neighbors = 100
+        self.pair_statistics = None
+        self.build_info = None
+        self._metadata_codes = None
     
     def calculate_pearson_correlation(self, item1_ratings, item2_ratings):
         """
@@ -156,6 +163,71 @@ class ItemBasedCollaborativeFiltering:
         except Exception as e:
             return 0.1  # Default low similarity on error
     
+    def _set_items_data(self, items_data):
+        """
+        Store the item metadata and drop the catalog and metadata codes built from it
+        """
+        super()._set_items_data(items_data)
+        self._metadata_codes = None
+    
+    def _get_metadata_codes(self):
+        """
+        Integer-encoded metadata attributes of the item catalog (one column per
+        METADATA_WEIGHTS attribute), built on first use
+        
+        Missing values are encoded as -1 and never match. An attribute missing
+        from items_data gets the same code for every item, like comparing two
+        missing fields in calculate_metadata_similarity.
+        """
+        if self._metadata_codes is None:
+            catalog = self._get_catalog()
+            codes = np.zeros((len(catalog), len(self.METADATA_WEIGHTS)), dtype=np.int32)
+            for column, (attribute, _) in enumerate(self.METADATA_WEIGHTS):
+                if attribute in catalog.codes:
+                    codes[:, column] = catalog.codes[attribute]
+                elif attribute in catalog.values:
+                    codes[:, column] = pd.factorize(catalog.values[attribute])[0]
+            self._metadata_codes = codes
+        return self._metadata_codes
+    
+    def calculate_metadata_similarity_block(self, row_item_ids, column_item_ids=None):
+        """
+        Metadata similarity of a block of items against other items in one pass
+        
+        Gives the same scores as calculate_metadata_similarity for every pair,
+        including the 0.7 cap and 0.1 for items without metadata.
+        
+        Args:
+            row_item_ids: Item ids of the block rows
+            column_item_ids: Item ids to compare against (all model items when None)
+            
+        Returns:
+            Array of shape (len(row_item_ids), len(column_item_ids))
+        """
+        if column_item_ids is None:
+            column_item_ids = self.item_ids
+        n_rows, n_columns = len(row_item_ids), len(column_item_ids)
+        if self.items_data is None:
+            return np.full((n_rows, n_columns), 0.1)
+        
+        codes = self._get_metadata_codes()
+        row_positions = self._get_catalog().rows(row_item_ids)
+        column_positions = self._get_catalog().rows(column_item_ids)
+        row_codes = codes[row_positions]
+        column_codes = codes[column_positions]
+        
+        similarity = np.zeros((n_rows, n_columns))
+        for attribute, (_, weight) in enumerate(self.METADATA_WEIGHTS):
+            matches = ((row_codes[:, attribute, None] == column_codes[None, :, attribute])
+                       & (row_codes[:, attribute, None] >= 0))
+            similarity += weight * matches
+        np.minimum(similarity, 0.7, out=similarity)
+        
+        # Items without metadata get the default low similarity
+        similarity[row_positions < 0, :] = 0.1
+        similarity[:, column_positions < 0] = 0.1
+        return similarity
+    
     def calculate_fallback_similarity(self, item1_ratings, item2_ratings):
         """
         Calculate similarity when no common users exist using item characteristics
@@ -189,188 +261,1098 @@ class ItemBasedCollaborativeFiltering:
         # Should not reach here, but fallback
         return self.calculate_fallback_similarity(item1_ratings, item2_ratings)
     
-    def build_item_similarity_matrix(self, max_items=5000):
+    def _prepare_rating_operands(self, ratings, kernel='pearson'):
+        """
+        Build the sparse operands shared by the vectorized similarity kernels.
+        Zero ratings are treated as missing values, exactly like the per-pair path.
+        The adjusted cosine kernel also gets the ratings centered on each user's mean.
+        """
+        ratings = csc_matrix(ratings, dtype=np.float64)
+        ratings.data[ratings.data < 0] = 0
+        ratings.eliminate_zeros()
+        ratings.sort_indices()
+        ratings_csr = ratings.tocsr()
+        ratings_csr.sort_indices()
+        
+        # Indicator and squared ratings reuse the index arrays of the ratings,
+        # so every product below yields identically structured results
+        operands = {}
+        for suffix, matrix, matrix_class in [('', ratings, csc_matrix), ('_csr', ratings_csr, csr_matrix)]:
+            operands['ratings' + suffix] = matrix
+            operands['rated' + suffix] = matrix_class(
+                (np.ones_like(matrix.data), matrix.indices, matrix.indptr), shape=matrix.shape
+            )
+            operands['squared' + suffix] = matrix_class(
+                (matrix.data ** 2, matrix.indices, matrix.indptr), shape=matrix.shape
+            )
+        
+        if kernel == 'adjusted_cosine':
+            user_counts = np.diff(ratings_csr.indptr)
+            user_means = np.zeros(ratings.shape[0])
+            np.divide(np.asarray(ratings_csr.sum(axis=1)).ravel(), user_counts, out=user_means, where=user_counts > 0)
+            # Ratings equal to the user's mean stay stored as explicit zeros
+            operands['centered'] = csc_matrix(
+                (ratings.data - user_means[ratings.indices], ratings.indices, ratings.indptr), shape=ratings.shape
+            )
+            operands['centered_csr'] = csr_matrix(
+                (ratings_csr.data - np.repeat(user_means, user_counts), ratings_csr.indices, ratings_csr.indptr),
+                shape=ratings_csr.shape
+            )
+        return operands
+    
+    def _pearson_from_statistics(self, n, sx, sy, sxx, syy, sxy):
+        """
+        Vectorized equivalent of calculate_pearson_correlation working on the
+        co-rated sufficient statistics of many item pairs at once.
+        All arguments are aligned 1-D arrays (co-count, sums, sums of squares, cross-products).
+        """
+        n = np.asarray(n, dtype=np.float64)
+        numerator = n * sxy - sx * sy
+        var_x = n * sxx - sx * sx
+        var_y = n * syy - sy * sy
+        
+        # Constant rating patterns make pearsonr return NaN
+        constant = (var_x <= 1e-10 * n * sxx) | (var_y <= 1e-10 * n * syy)
+        
+        correlation = np.zeros(len(n))
+        valid = ~constant
+        correlation[valid] = numerator[valid] / np.sqrt(var_x[valid] * var_y[valid])
+        correlation = np.clip(correlation, -1.0, 1.0)
+        
+        # Identical constant patterns get a high but not perfect correlation
+        identical = (sxx + syy - 2 * sxy) <= 1e-10 * (sxx + syy)
+        correlation[constant & identical] = 0.95
+        
+        # Need at least 2 common ratings to calculate correlation
+        correlation[n < 2] = 0.0
+        
+        # Cap correlation to prevent perfect 1.0 correlations between different items
+        return np.minimum(correlation, 0.99)
+    
+    def _pair_statistics_block(self, operands, start, stop):
+        """
+        Compute the co-rated sufficient statistics between items[start:stop] and all items.
+        
+        Returns a dict of CSR matrices of shape (stop - start, n_items) with identical
+        sparsity structure: co-count, sum_x, sum_y, sum_xx, sum_yy and sum_xy, where
+        x is the rating of the block item and y the rating of the other item.
+        """
+        ratings_block = operands['ratings'][:, start:stop].T.tocsr()
+        rated_block = operands['rated'][:, start:stop].T.tocsr()
+        squared_block = operands['squared'][:, start:stop].T.tocsr()
+        
+        products = {
+            'count': rated_block @ operands['rated_csr'],
+            'sum_x': ratings_block @ operands['rated_csr'],
+            'sum_y': rated_block @ operands['ratings_csr'],
+            'sum_xx': squared_block @ operands['rated_csr'],
+            'sum_yy': rated_block @ operands['squared_csr'],
+            'sum_xy': ratings_block @ operands['ratings_csr']
+        }
+        statistics = {}
+        for name, product in products.items():
+            product = product.tocsr()
+            product.sort_indices()
+            statistics[name] = product
+        return statistics
+    
+    def _pearson_block_from_statistics(self, statistics):
+        """
+        Turn a block of pair statistics into a sparse block of Pearson correlations,
+        keeping only pairs with at least 2 common raters.
+        """
+        co_counts = statistics['count']
+        similarities = self._pearson_from_statistics(
+            co_counts.data,
+            statistics['sum_x'].data,
+            statistics['sum_y'].data,
+            statistics['sum_xx'].data,
+            statistics['sum_yy'].data,
+            statistics['sum_xy'].data
+        )
+        
+        block = csr_matrix(
+            (similarities, co_counts.indices.copy(), co_counts.indptr.copy()),
+            shape=co_counts.shape
+        )
+        
+        # Drop pairs with fewer than 2 common raters
+        block.data[co_counts.data < 2] = 0.0
+        block.eliminate_zeros()
+        return block
+    
+    def _pearson_similarity_block(self, operands, start, stop):
+        """
+        Compute co-rated Pearson correlations between items[start:stop] and all items.
+        
+        Returns a sparse CSR matrix of shape (stop - start, n_items) holding every
+        pair with at least 2 common raters.
+        """
+        return self._pearson_block_from_statistics(self._pair_statistics_block(operands, start, stop))
+    
+    def _cosine_block(self, values, values_csr, start, stop):
+        """
+        Cosine similarities between columns start:stop of values and all columns,
+        with each item's norm taken over all of its raters.
+        """
+        dots = (values[:, start:stop].T.tocsr() @ values_csr).tocsr()
+        dots.sort_indices()
+        norms = np.sqrt(np.asarray(values.multiply(values).sum(axis=0)).ravel())
+        
+        rows = np.repeat(np.arange(stop - start), np.diff(dots.indptr))
+        denominators = norms[start:stop][rows] * norms[dots.indices]
+        similarities = np.zeros(len(dots.data))
+        np.divide(dots.data, denominators, out=similarities, where=denominators > 0)
+        
+        block = csr_matrix((similarities, dots.indices, dots.indptr), shape=dots.shape)
+        block.eliminate_zeros()
+        return block
+    
+    def _cosine_similarity_block(self, operands, start, stop):
+        """
+        Cosine similarities of the raw rating vectors between items[start:stop] and all items
+        """
+        return self._cosine_block(operands['ratings'], operands['ratings_csr'], start, stop)
+    
+    def _adjusted_cosine_similarity_block(self, operands, start, stop):
+        """
+        Adjusted cosine similarities (ratings centered on each user's mean) between
+        items[start:stop] and all items; needs operands prepared with kernel='adjusted_cosine'.
+        """
+        return self._cosine_block(operands['centered'], operands['centered_csr'], start, stop)
+    
+    def _jaccard_similarity_block(self, operands, start, stop):
+        """
+        Jaccard similarities of the rater sets between items[start:stop] and all items
+        """
+        co_counts = (operands['rated'][:, start:stop].T.tocsr() @ operands['rated_csr']).tocsr()
+        co_counts.sort_indices()
+        item_counts = np.diff(operands['rated'].indptr).astype(np.float64)
+        
+        rows = np.repeat(np.arange(stop - start), np.diff(co_counts.indptr))
+        unions = item_counts[start:stop][rows] + item_counts[co_counts.indices] - co_counts.data
+        return csr_matrix((co_counts.data / unions, co_counts.indices, co_counts.indptr), shape=co_counts.shape)
+    
+    def _top_k_neighbors(self, block, row_items, n_neighbors):
+        """
+        Reduce a block of similarity rows to at most n_neighbors positive
+        neighbors per item, sorted by score (highest first).
+        row_items holds the item position of each block row.
+        
+        Returns:
+            Tuple of (neighbor counts per row, neighbor indices, neighbor scores)
+        """
+        block = block.tocoo()
+        rows, cols, scores = block.row, block.col, block.data
+        
+        # Only positive correlations with other items are kept
+        keep = (scores > 0) & (cols != np.asarray(row_items)[rows])
+        rows, cols, scores = rows[keep], cols[keep], scores[keep]
+        
+        # Sort by row, then by score descending (ties broken by item position)
+        order = np.lexsort((cols, -scores, rows))
+        rows, cols, scores = rows[order], cols[order], scores[order]
+        
+        # Rank of each entry within its row
+        row_starts = np.searchsorted(rows, np.arange(block.shape[0]))
+        ranks = np.arange(len(rows)) - row_starts[rows]
+        keep = ranks < n_neighbors
+        rows, cols, scores = rows[keep], cols[keep], scores[keep]
+        
+        counts = np.bincount(rows, minlength=block.shape[0])
+        return counts, cols.astype(np.int32), scores
+    
+    @profiled_phase('build_item_similarity_matrix')
+    def build_item_similarity_matrix(self, max_items=None, block_size=1000, n_neighbors=100,
+                                     keep_statistics=False, n_jobs=1, use_lsh=False,
+                                     lsh_bands=64, lsh_rows=1, checkpoint_dir=None, kernel='pearson'):
         """
-        Build item-item similarity matrix using Pearson correlation
-        Increased to top 5000 items for better accuracy
+        Build the item-item similarity model as a top-K neighbor index
+        
+        Correlations are computed with the vectorized sparse engine: co-rating counts,
+        sums, sums of squares and cross-products for a block of items against all items
+        come from sparse matrix products, so no per-pair Python work is needed.
+        Only the n_neighbors strongest positive correlations of each item are stored,
+        so memory grows linearly with the number of items.
+        
+        kernel selects the similarity from SIMILARITY_KERNELS: 'pearson' (co-rated
+        Pearson, the default), or the cheaper 'adjusted_cosine', 'cosine' and
+        'jaccard' kernels, which need one sparse product per block instead of six.
+        All kernels share the blocked, parallel and checkpointed execution; pair
+        statistics and LSH are only available for Pearson.
+        
+        With keep_statistics the per-pair sufficient statistics are kept as well,
+        which lets update() refresh the model from a ratings delta file.
+        
+        With n_jobs > 1 (or -1 for all cores) the item blocks are processed in a
+        process pool whose workers read the rating matrix from shared memory.
+        
+        max_items limits an already loaded matrix to its most rated items; prefer
+        load_data(max_items=...), which selects them while the ratings are streamed.
+        
+        With use_lsh the exact all-pairs products are replaced by MinHash LSH over
+        each item's rater set: only pairs that share a bucket in at least one of
+        lsh_bands bands of lsh_rows hashes are scored. More bands or fewer rows per
+        band raise recall at the cost of more candidate pairs; use
+        report_candidate_recall() to measure the recall against the exact build.
+        
+        With checkpoint_dir every finished item block is written to that directory
+        together with a manifest. The manifest is keyed by a content hash of the
+        rating matrix and the build parameters, so a restarted build on the same
+        data skips the blocks that are already complete; a checkpoint of other data
+        is discarded.
         """
         print("Building item similarity matrix...")
         
-        items = self.user_item_matrix.columns
+        if use_lsh and keep_statistics:
+            raise ValueError("Pair statistics need the exact build; disable use_lsh to keep them")
+        if use_lsh and checkpoint_dir is not None:
+            raise ValueError("Checkpoints need the blocked exact build; disable use_lsh to use them")
+        if kernel not in self.SIMILARITY_KERNELS:
+            raise ValueError(f"kernel must be one of {list(self.SIMILARITY_KERNELS)}, got {kernel!r}")
+        if kernel != 'pearson' and (keep_statistics or use_lsh):
+            raise ValueError("Pair statistics and LSH are only available for the pearson kernel")
+        
+        items = self.item_ids
         n_items = len(items)
         
-        # Limit number of items to 5000 for better accuracy while maintaining efficiency
-        if n_items > max_items:
+        # Optionally limit the number of items to the most rated ones
+        if max_items is not None and n_items > max_items:
             print(f"Limiting items from {n_items} to {max_items} for memory efficiency")
-            item_counts = self.user_item_matrix.astype(bool).sum(axis=0)
-            top_items = item_counts.nlargest(max_items).index
-            self.user_item_matrix = self.user_item_matrix[top_items]
-            items = top_items
+            item_counts = np.bincount(self.user_item_matrix.indices, minlength=n_items)
+            top_items = np.sort(np.argsort(-item_counts, kind='stable')[:max_items])
+            self._set_user_item_matrix(self.user_item_matrix[:, top_items])
+            items = items[top_items]
             n_items = len(items)
+            # The item means below are indexed by the retained items
+            self.item_ids = items
+            self.item_index = _IdIndex.from_ids(items)
         
-        print(f"Processing {n_items} items for correlation calculation")
+        print(f"Processing {n_items} items with the {kernel} kernel")
         
-        # Initialize similarity matrix
-        self.item_similarity_matrix = pd.DataFrame(
-            np.zeros((n_items, n_items)), 
-            index=items, 
-            columns=items
-        )
+        operands = self._prepare_rating_operands(self.user_item_matrix, kernel)
         
         # Calculate item means for each item
-        self.item_means = {}
-        for item in items:
-            item_ratings = self.user_item_matrix[item]
-            rated_users = item_ratings > 0
-            if rated_users.sum() > 0:
-                self.item_means[item] = item_ratings[rated_users].mean()
-            else:
-                self.item_means[item] = 3.0  # Default rating
-        
-        # Calculate pairwise similarities
-        for i, item1 in enumerate(items):
-            if i % 50 == 0:
-                print(f"Processing item {i+1}/{n_items}")
-            
-            for j, item2 in enumerate(items):
-                if i == j:
-                    # Self-correlation should be 1.0 (perfect correlation with itself)
-                    self.item_similarity_matrix.loc[item1, item2] = 1.0
-                elif i < j:  # Calculate only upper triangle to avoid redundant calculations
-                    item1_ratings = self.user_item_matrix[item1]
-                    item2_ratings = self.user_item_matrix[item2]
-                    
-                    similarity = self.calculate_pearson_correlation(item1_ratings, item2_ratings)
-                    
-                    # Store in both positions (symmetric matrix)
-                    self.item_similarity_matrix.loc[item1, item2] = similarity
-                    self.item_similarity_matrix.loc[item2, item1] = similarity
-        
-        print("Item similarity matrix completed!")
+        self._compute_item_means()
+        
+        if use_lsh:
+            build_start = time.perf_counter()
+            counts, indices, scores, n_candidates = self._lsh_neighbors(
+                operands, n_neighbors, lsh_bands, lsh_rows)
+            wall_time = time.perf_counter() - build_start
+            self.build_info = {
+                'kernel': kernel,
+                'n_jobs': 1,
+                'n_tiles': 0,
+                'wall_time': wall_time,
+                'tile_time': wall_time,
+                'speedup': 1.0,
+                'lsh_bands': lsh_bands,
+                'lsh_rows': lsh_rows,
+                'candidate_pairs': n_candidates
+            }
+            print(f"Similarity build: {wall_time:.2f}s wall time on "
+                  f"{n_candidates:,} LSH candidate pairs")
+            self.pair_statistics = None
+            self._set_neighbor_index(items, counts, indices, scores, n_neighbors)
+            record_counts(self, items=n_items, candidate_pairs=n_candidates, neighbor_pairs=len(self.neighbor_scores))
+            print(f"Item similarity matrix completed! Stored {len(self.neighbor_scores):,} neighbor pairs")
+            return self
+        
+        # Calculate similarities block by block, keeping the top neighbors of each item
+        tiles = [(start, min(start + block_size, n_items)) for start in range(0, n_items, block_size)]
+        
+        # Blocks finished by an earlier run on the same data
+        results = {}
+        if checkpoint_dir is not None:
+            data_hash = self._checkpoint_hash(block_size, n_neighbors, keep_statistics, kernel)
+            for start in self._open_checkpoint(checkpoint_dir, data_hash):
+                results[start] = self._read_checkpoint_block(checkpoint_dir, start, keep_statistics)
+            if results:
+                print(f"Resuming from checkpoint: {len(results)}/{len(tiles)} blocks already computed")
+        pending = [(start, stop) for start, stop in tiles if start not in results]
+        
+        if n_jobs is None or n_jobs < 1:
+            n_jobs = os.cpu_count() or 1
+        n_jobs = min(n_jobs, max(len(pending), 1))
+        
+        tile_time = 0.0
+        build_start = time.perf_counter()
+        for start, counts, indices, scores, statistics, elapsed in self._run_similarity_tiles(
+                operands, pending, n_neighbors, keep_statistics, n_jobs, kernel):
+            print(f"Processing items {start+1}-{start+len(counts)}/{n_items}")
+            results[start] = (counts, indices, scores, statistics if keep_statistics else None)
+            if checkpoint_dir is not None:
+                self._write_checkpoint_block(checkpoint_dir, data_hash, start, results[start], sorted(results))
+            tile_time += elapsed
+        wall_time = time.perf_counter() - build_start
+        
+        neighbor_counts = [results[start][0] for start, _ in tiles]
+        neighbor_indices = [results[start][1] for start, _ in tiles]
+        neighbor_scores = [results[start][2] for start, _ in tiles]
+        statistics_blocks = [results[start][3] for start, _ in tiles] if keep_statistics else []
+        
+        # Speedup of the tiled build relative to computing every tile on one core
+        # (total tile CPU time over wall time)
+        self.build_info = {
+            'kernel': kernel,
+            'n_jobs': n_jobs,
+            'n_tiles': len(tiles),
+            'wall_time': wall_time,
+            'tile_time': tile_time,
+            'speedup': tile_time / wall_time if wall_time > 0 else 1.0,
+            'resumed_tiles': len(tiles) - len(pending)
+        }
+        print(f"Similarity build: {wall_time:.2f}s wall time, {tile_time:.2f}s tile CPU time "
+              f"on {n_jobs} worker(s) ({self.build_info['speedup']:.2f}x speedup)")
+        
+        self.pair_statistics = None
+        if keep_statistics:
+            self.pair_statistics = {
+                name: vstack([block[name] for block in statistics_blocks], format='csr')
+                if statistics_blocks else csr_matrix((n_items, n_items))
+                for name in self.PAIR_STATISTICS
+            }
+        
+        self._set_neighbor_index(
+            items,
+            np.concatenate(neighbor_counts) if neighbor_counts else np.zeros(0, dtype=np.int64),
+            np.concatenate(neighbor_indices) if neighbor_indices else np.zeros(0, dtype=np.int32),
+            np.concatenate(neighbor_scores) if neighbor_scores else np.zeros(0),
+            n_neighbors
+        )
+        
+        record_counts(self, items=n_items, tiles=len(tiles), resumed_tiles=len(tiles) - len(pending),
+                      neighbor_pairs=len(self.neighbor_scores))
+        print(f"Item similarity matrix completed! Stored {len(self.neighbor_scores):,} neighbor pairs")
         return self
     
-    def predict_rating(self, user_id, item_id, k=10):
+    def _minhash_signatures(self, ratings, num_hashes, random_state=42):
         """
-        Predict rating for a user-item pair using item-based CF
+        MinHash signature of each item's rater set
+        
+        Each hash is a random universal hash of the user position, and an item's
+        signature entry is the minimum hash value over the users who rated it.
+        
+        Returns:
+            Array of shape (num_hashes, n_items); items without ratings hold the
+            hash modulus in every entry
+        """
+        prime = np.int64(2**31 - 1)
+        rng = np.random.RandomState(random_state)
+        a = rng.randint(1, 2**31 - 1, size=num_hashes).astype(np.int64)
+        b = rng.randint(0, 2**31 - 1, size=num_hashes).astype(np.int64)
+        
+        users = ratings.indices.astype(np.int64)
+        rated_items = np.flatnonzero(np.diff(ratings.indptr))
+        signatures = np.full((num_hashes, ratings.shape[1]), prime, dtype=np.int64)
+        if len(rated_items) == 0:
+            return signatures
+        starts = ratings.indptr[rated_items]
+        for h in range(num_hashes):
+            hashed = (a[h] * users + b[h]) % prime
+            signatures[h, rated_items] = np.minimum.reduceat(hashed, starts)
+        return signatures
+    
+    def _lsh_candidate_pairs(self, signatures, bands, rows, eligible, max_bucket_size=500):
         """
-        if user_id not in self.user_item_matrix.index:
-            return self.item_means.get(item_id, 3.0)  # Default rating
+        Item pairs that share an LSH bucket in at least one band
         
-        if item_id not in self.user_item_matrix.columns:
-            return 3.0  # Default rating
+        Only eligible items are bucketed. Buckets larger than max_bucket_size only
+        pair items that are less than max_bucket_size positions apart, which keeps
+        the number of candidates linear in the number of items.
         
-        # Get user's ratings
-        user_ratings = self.user_item_matrix.loc[user_id]
+        Returns:
+            Tuple of (first item positions, second item positions) with first < second
+        """
+        n_items = signatures.shape[1]
+        items = np.flatnonzero(eligible)
+        rng = np.random.RandomState(0)
+        multipliers = (rng.randint(1, 2**31 - 1, size=rows).astype(np.uint64) << np.uint64(1)) | np.uint64(1)
         
-        # Get items rated by the user
-        rated_items = user_ratings[user_ratings > 0].index
+        pair_keys = []
+        for band in range(bands):
+            band_signature = signatures[band * rows:(band + 1) * rows][:, items].astype(np.uint64)
+            bucket = (band_signature * multipliers[:, None]).sum(axis=0)
+            order = np.argsort(bucket, kind='stable')
+            bucket, band_items = bucket[order], items[order]
+            
+            # Pair every item with the following ones in the same bucket
+            for offset in range(1, min(max_bucket_size, len(band_items))):
+                same = bucket[offset:] == bucket[:-offset]
+                if not same.any():
+                    break
+                first = band_items[:-offset][same]
+                second = band_items[offset:][same]
+                low, high = np.minimum(first, second), np.maximum(first, second)
+                pair_keys.append(low.astype(np.int64) * n_items + high)
         
-        if len(rated_items) == 0:
-            return self.item_means.get(item_id, 3.0)
+        if not pair_keys:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        pair_keys = np.unique(np.concatenate(pair_keys))
+        return pair_keys // n_items, pair_keys % n_items
+    
+    def _pair_statistics_for_pairs(self, operands, first, second, chunk_size=2000000):
+        """
+        Co-rating sufficient statistics for an explicit list of item pairs
         
-        # Get similarities between target item and rated items
-        similarities = []
-        weighted_ratings = []
+        For each pair the raters of the item with fewer ratings are scanned and the
+        other item's rating is looked up in the sorted (user, item) keys of the
+        rating matrix, so the work is the sum of the smaller rater counts.
         
-        for rated_item in rated_items:
-            if rated_item in self.item_similarity_matrix.index:
-                sim = self.item_similarity_matrix.loc[item_id, rated_item]
-                if sim > 0:  # Only consider positive correlations
-                    similarities.append(sim)
-                    weighted_ratings.append(sim * user_ratings[rated_item])
+        Returns:
+            Dictionary of PAIR_STATISTICS arrays aligned with the pairs
+        """
+        ratings = operands['ratings']
+        ratings_csr = operands['ratings_csr']
+        n_users, n_items = ratings.shape
+        keys = (np.repeat(np.arange(n_users, dtype=np.int64), np.diff(ratings_csr.indptr)) * n_items
+                + ratings_csr.indices)
         
-        if len(similarities) == 0:
+        rater_counts = np.diff(ratings.indptr)
+        swap = rater_counts[first] > rater_counts[second]
+        scan = np.where(swap, second, first)
+        probe = np.where(swap, first, second)
+        lengths = rater_counts[scan]
+        ends = np.cumsum(lengths)
+        
+        statistics = {name: np.zeros(len(first)) for name in self.PAIR_STATISTICS}
+        start = 0
+        while start < len(first):
+            offset = ends[start - 1] if start > 0 else 0
+            stop = max(int(np.searchsorted(ends, offset + chunk_size, side='right')), start + 1)
+            chunk_lengths = lengths[start:stop]
+            total = int(chunk_lengths.sum())
+            
+            # Positions of every rater of the scanned items in the CSC arrays
+            pair = np.repeat(np.arange(stop - start), chunk_lengths)
+            within = np.arange(total) - np.repeat(np.cumsum(chunk_lengths) - chunk_lengths, chunk_lengths)
+            positions = np.repeat(ratings.indptr[scan[start:stop]], chunk_lengths) + within
+            users = ratings.indices[positions]
+            x = ratings.data[positions]
+            
+            lookup = users.astype(np.int64) * n_items + probe[start:stop][pair]
+            found_at = np.minimum(np.searchsorted(keys, lookup), len(keys) - 1)
+            found = keys[found_at] == lookup
+            pair, x, y = pair[found], x[found], ratings_csr.data[found_at[found]]
+            
+            size = stop - start
+            statistics['count'][start:stop] = np.bincount(pair, minlength=size)
+            statistics['sum_x'][start:stop] = np.bincount(pair, weights=x, minlength=size)
+            statistics['sum_y'][start:stop] = np.bincount(pair, weights=y, minlength=size)
+            statistics['sum_xx'][start:stop] = np.bincount(pair, weights=x * x, minlength=size)
+            statistics['sum_yy'][start:stop] = np.bincount(pair, weights=y * y, minlength=size)
+            statistics['sum_xy'][start:stop] = np.bincount(pair, weights=x * y, minlength=size)
+            start = stop
+        
+        return statistics
+    
+    def _lsh_neighbors(self, operands, n_neighbors, bands, rows, random_state=42):
+        """
+        Top-K neighbors from exact Pearson on MinHash LSH candidate pairs
+        
+        Returns:
+            Tuple of (neighbor counts per item, neighbor indices, neighbor scores,
+            number of candidate pairs scored)
+        """
+        ratings = operands['ratings']
+        n_items = ratings.shape[1]
+        
+        print(f"Generating LSH candidates with {bands} bands of {rows} rows...")
+        signatures = self._minhash_signatures(ratings, bands * rows, random_state)
+        # Items need at least two raters to reach two co-raters with anything
+        eligible = np.diff(ratings.indptr) >= 2
+        first, second = self._lsh_candidate_pairs(signatures, bands, rows, eligible)
+        n_candidates = len(first)
+        all_pairs = int(eligible.sum()) * (int(eligible.sum()) - 1) // 2
+        print(f"Scoring {len(first):,} candidate pairs "
+              f"({len(first) / max(all_pairs, 1):.1%} of {all_pairs:,} item pairs)")
+        
+        statistics = self._pair_statistics_for_pairs(operands, first, second)
+        similarities = self._pearson_from_statistics(
+            statistics['count'], statistics['sum_x'], statistics['sum_y'],
+            statistics['sum_xx'], statistics['sum_yy'], statistics['sum_xy']
+        )
+        keep = (statistics['count'] >= 2) & (similarities > 0)
+        first, second, similarities = first[keep], second[keep], similarities[keep]
+        
+        similarity_matrix = csr_matrix(
+            (np.concatenate([similarities, similarities]),
+             (np.concatenate([first, second]), np.concatenate([second, first]))),
+            shape=(n_items, n_items)
+        )
+        counts, indices, scores = self._top_k_neighbors(similarity_matrix, np.arange(n_items), n_neighbors)
+        return counts, indices, scores, n_candidates
+    
+    def report_candidate_recall(self, block_size=1000):
+        """
+        Recall of the current neighbor index against the exact build
+        
+        Recomputes the exact top-K neighbors block by block and reports which share
+        of them the stored (e.g. LSH-built) index contains.
+        
+        Returns:
+            Dictionary with exact neighbor count, neighbors found and recall
+        """
+        operands = self._prepare_rating_operands(self.user_item_matrix)
+        n_items = len(self.item_ids)
+        found = 0
+        total = 0
+        for start in range(0, n_items, block_size):
+            stop = min(start + block_size, n_items)
+            counts, indices, _, _ = self._similarity_tile(operands, start, stop, self.n_neighbors, False)
+            exact_keys = np.repeat(np.arange(start, stop, dtype=np.int64), counts) * n_items + indices
+            
+            lo, hi = self.neighbor_indptr[start], self.neighbor_indptr[stop]
+            stored_rows = np.repeat(np.arange(start, stop, dtype=np.int64),
+                                    np.diff(self.neighbor_indptr[start:stop + 1]))
+            stored_keys = stored_rows * n_items + self.neighbor_indices[lo:hi]
+            
+            found += int(np.isin(exact_keys, stored_keys).sum())
+            total += len(exact_keys)
+        
+        recall = found / total if total > 0 else 1.0
+        print(f"Neighbor recall vs exact build: {recall:.2%} ({found:,} of {total:,} exact top-{self.n_neighbors} neighbors)")
+        return {'exact_neighbors': total, 'found_neighbors': found, 'recall': recall}
+    
+    def benchmark_similarity_kernels(self, kernels=None, block_size=1000, n_neighbors=100, max_blocks=None):
+        """
+        Measure the throughput of the similarity kernels on the loaded rating matrix
+        
+        Every kernel runs the same single-process blocked build (kernel block plus
+        top-K selection) over the first max_blocks item blocks (all by default).
+        
+        Args:
+            kernels: Kernel names to measure (all of SIMILARITY_KERNELS by default)
+            block_size: Items per block
+            n_neighbors: Neighbors kept per item
+            max_blocks: Limit on the number of blocks measured per kernel
+            
+        Returns:
+            Dictionary mapping kernel name to seconds, items, scored pairs and
+            items/pairs per second
+        """
+        kernels = list(self.SIMILARITY_KERNELS) if kernels is None else kernels
+        n_items = len(self.item_ids)
+        tiles = [(start, min(start + block_size, n_items)) for start in range(0, n_items, block_size)]
+        if max_blocks is not None:
+            tiles = tiles[:max_blocks]
+        n_block_items = sum(stop - start for start, stop in tiles)
+        
+        print(f"Benchmarking similarity kernels on {n_block_items} of {n_items} items")
+        results = {}
+        for kernel in kernels:
+            if kernel not in self.SIMILARITY_KERNELS:
+                raise ValueError(f"kernel must be one of {list(self.SIMILARITY_KERNELS)}, got {kernel!r}")
+            operands = self._prepare_rating_operands(self.user_item_matrix, kernel)
+            kernel_method = getattr(self, self.SIMILARITY_KERNELS[kernel])
+            
+            pairs = 0
+            start_time = time.perf_counter()
+            for start, stop in tiles:
+                block = kernel_method(operands, start, stop)
+                self._top_k_neighbors(block, np.arange(start, stop), n_neighbors)
+                pairs += block.nnz
+            seconds = time.perf_counter() - start_time
+            
+            results[kernel] = {
+                'seconds': seconds,
+                'items': n_block_items,
+                'pairs': pairs,
+                'items_per_second': n_block_items / seconds if seconds > 0 else float('inf'),
+                'pairs_per_second': pairs / seconds if seconds > 0 else float('inf')
+            }
+            print(f"- {kernel}: {seconds:.3f}s, {results[kernel]['items_per_second']:,.0f} items/s, "
+                  f"{results[kernel]['pairs_per_second']:,.0f} pairs/s ({pairs:,} pairs)")
+        return results
+    
+    def _similarity_tile(self, operands, start, stop, n_neighbors, keep_statistics, kernel='pearson'):
+        """
+        Compute the top-K neighbors (and optionally the pair statistics) of items[start:stop]
+        """
+        statistics = None
+        if keep_statistics:
+            statistics = self._pair_statistics_block(operands, start, stop)
+            block = self._pearson_block_from_statistics(statistics)
+        else:
+            block = getattr(self, self.SIMILARITY_KERNELS[kernel])(operands, start, stop)
+        counts, indices, scores = self._top_k_neighbors(block, np.arange(start, stop), n_neighbors)
+        return counts, indices, scores, statistics
+    
+    def _run_similarity_tiles(self, operands, tiles, n_neighbors, keep_statistics, n_jobs, kernel='pearson'):
+        """
+        Process the item tiles in order, either in this process or in a process pool
+        attached to the rating operands through shared memory.
+        
+        Yields:
+            Tuples of (start, counts, indices, scores, statistics, CPU seconds spent on the tile)
+        """
+        if n_jobs <= 1:
+            for start, stop in tiles:
+                tile_start = time.process_time()
+                result = self._similarity_tile(operands, start, stop, n_neighbors, keep_statistics, kernel)
+                yield (start,) + result + (time.process_time() - tile_start,)
+            return
+        
+        segments, spec = _share_operands(operands)
+        try:
+            with multiprocessing.Pool(n_jobs, initializer=_attach_shared_operands, initargs=(spec,)) as pool:
+                tasks = [(start, stop, n_neighbors, keep_statistics, kernel) for start, stop in tiles]
+                for result in pool.imap(_compute_similarity_tile, tasks):
+                    yield result
+        finally:
+            for segment in segments:
+                segment.close()
+                segment.unlink()
+    
+    def _checkpoint_hash(self, block_size, n_neighbors, keep_statistics, kernel='pearson'):
+        """
+        Content hash of the rating matrix, the item ids and the build parameters
+        """
+        digest = hashlib.sha256()
+        matrix = self.user_item_matrix
+        for array in (np.asarray(matrix.shape, dtype=np.int64), matrix.indptr, matrix.indices,
+                      matrix.data, np.asarray(self.item_ids)):
+            digest.update(np.ascontiguousarray(array).data)
+        parameters = {'block_size': block_size, 'n_neighbors': n_neighbors,
+                      'keep_statistics': keep_statistics, 'kernel': kernel}
+        digest.update(json.dumps(parameters, sort_keys=True).encode())
+        return digest.hexdigest()
+    
+    def _open_checkpoint(self, checkpoint_dir, data_hash):
+        """
+        Prepare the checkpoint directory for a build of data_hash
+        
+        Returns:
+            Start items of the blocks already completed for this data (empty when
+            the directory held no checkpoint or one of other data, which is removed)
+        """
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        manifest_path = os.path.join(checkpoint_dir, 'manifest.json')
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            if (manifest.get('version') == self.CHECKPOINT_VERSION
+                    and manifest.get('data_hash') == data_hash):
+                return manifest['completed_blocks']
+            print(f"Discarding checkpoint in {checkpoint_dir} (built from other data)")
+        
+        for name in os.listdir(checkpoint_dir):
+            if name.startswith('block_') or name == 'manifest.json':
+                os.remove(os.path.join(checkpoint_dir, name))
+        self._write_checkpoint_manifest(checkpoint_dir, data_hash, [])
+        return []
+    
+    def _write_checkpoint_manifest(self, checkpoint_dir, data_hash, completed_blocks):
+        """
+        Atomically replace the checkpoint manifest
+        """
+        manifest = {
+            'format': 'item_based_cf_checkpoint',
+            'version': self.CHECKPOINT_VERSION,
+            'data_hash': data_hash,
+            'completed_blocks': [int(start) for start in completed_blocks]
+        }
+        manifest_path = os.path.join(checkpoint_dir, 'manifest.json')
+        with open(manifest_path + '.tmp', 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(manifest_path + '.tmp', manifest_path)
+    
+    def _write_checkpoint_block(self, checkpoint_dir, data_hash, start, result, completed_blocks):
+        """
+        Write one finished block, then list it in the manifest; a crash in between
+        only leaves an unlisted block file that the next run recomputes.
+        """
+        counts, indices, scores, statistics = result
+        arrays = {'counts': counts, 'indices': indices, 'scores': scores}
+        for name, matrix in (statistics or {}).items():
+            arrays[f'{name}_data'] = matrix.data
+            arrays[f'{name}_indices'] = matrix.indices
+            arrays[f'{name}_indptr'] = matrix.indptr
+            arrays[f'{name}_shape'] = np.asarray(matrix.shape, dtype=np.int64)
+        
+        block_path = os.path.join(checkpoint_dir, f'block_{start:09d}.npz')
+        with open(block_path + '.tmp', 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(block_path + '.tmp', block_path)
+        self._write_checkpoint_manifest(checkpoint_dir, data_hash, completed_blocks)
+    
+    def _read_checkpoint_block(self, checkpoint_dir, start, keep_statistics):
+        """
+        Read one finished block back as (counts, indices, scores, statistics)
+        """
+        with np.load(os.path.join(checkpoint_dir, f'block_{start:09d}.npz')) as block:
+            statistics = None
+            if keep_statistics:
+                statistics = {
+                    name: csr_matrix(
+                        (block[f'{name}_data'], block[f'{name}_indices'], block[f'{name}_indptr']),
+                        shape=tuple(block[f'{name}_shape'])
+                    )
+                    for name in self.PAIR_STATISTICS
+                }
+            return block['counts'], block['indices'], block['scores'], statistics
+    
+    def _set_neighbor_index(self, items, counts, indices, scores, n_neighbors):
+        """
+        Store the top-K neighbor index and the item id lookups
+        
+        Neighbors whose score rounds to zero at the storage precision (below half
+        an int8 step) are dropped, since they would count as neighbors without
+        carrying any weight.
+        """
+        self.item_ids = np.asarray(items)
+        self.item_index = _IdIndex.from_ids(self.item_ids)
+        scores = self._quantize_scores(scores)
+        kept = scores != 0
+        if not kept.all():
+            entry_rows = np.repeat(np.arange(len(self.item_ids)), counts)
+            counts = np.bincount(entry_rows[kept], minlength=len(self.item_ids))
+            indices = np.asarray(indices)[kept]
+            scores = scores[kept]
+        self.neighbor_indptr = np.zeros(len(self.item_ids) + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.neighbor_indptr[1:])
+        self.neighbor_indices = indices
+        self.neighbor_scores = scores
+        self.n_neighbors = n_neighbors
+        self._set_reverse_neighbor_index()
+    
+    def _set_reverse_neighbor_index(self, neighbor_rows=None, reverse_indptr=None, reverse_entries=None):
+        """
+        Store the item (row) of every neighbor index entry and the reverse neighbor
+        index: for each item, the entries that list it as a neighbor, in entry order
+        
+        Per-user predictions walk the reverse index from the user's rated items, so
+        they touch only the entries whose neighbor the user rated. The arrays are
+        computed from the neighbor index unless given (loaded from an artifact).
+        """
+        n_items = len(self.item_ids)
+        if neighbor_rows is None:
+            neighbor_rows = np.repeat(np.arange(n_items, dtype=np.int32), np.diff(self.neighbor_indptr))
+        if reverse_indptr is None or reverse_entries is None:
+            entry_dtype = np.int32 if len(self.neighbor_indices) < 2**31 else np.int64
+            reverse_entries = np.argsort(self.neighbor_indices, kind='stable').astype(entry_dtype)
+            reverse_indptr = np.zeros(n_items + 1, dtype=np.int64)
+            np.cumsum(np.bincount(self.neighbor_indices, minlength=n_items), out=reverse_indptr[1:])
+        self.neighbor_rows = neighbor_rows
+        self.reverse_indptr = reverse_indptr
+        self.reverse_entries = reverse_entries
+    
+    def _quantize_scores(self, scores):
+        """
+        Convert similarity scores to the storage precision
+        """
+        scores = np.asarray(scores)
+        if self.precision == 'int8':
+            return np.clip(np.rint(scores / self.score_scale), -127, 127).astype(np.int8)
+        return scores.astype(self.precision, copy=False)
+    
+    def dequantize_scores(self, scores):
+        """
+        Similarity values of stored neighbor scores (int8 scores are scaled back)
+        """
+        if scores.dtype == np.int8:
+            return scores.astype(np.float32) * np.float32(self.score_scale)
+        return scores
+    
+    def set_precision(self, precision):
+        """
+        Change the storage precision of the neighbor scores
+        
+        Scores are converted from their current values, so precision lost by an
+        earlier reduction is not recovered. Neighbors whose score rounds to zero
+        at the new precision are dropped.
+        """
+        if precision not in self.PRECISIONS:
+            raise ValueError(f"precision must be one of {self.PRECISIONS}, got {precision!r}")
+        scores = self.dequantize_scores(self.neighbor_scores) if self.neighbor_scores is not None else None
+        self.precision = precision
+        self.score_scale = self.INT8_SCORE_SCALE if precision == 'int8' else None
+        if scores is not None:
+            self._set_neighbor_index(self.item_ids, np.diff(self.neighbor_indptr), self.neighbor_indices,
+                                     scores, self.n_neighbors)
+        return self
+    
+    def _neighbor_index_from_dense(self, similarity_matrix, n_neighbors=100):
+        """
+        Convert a dense item similarity DataFrame (older model files) into the top-K neighbor index
+        """
+        block = csr_matrix(similarity_matrix.values)
+        counts, indices, scores = self._top_k_neighbors(block, np.arange(block.shape[0]), n_neighbors)
+        self._set_neighbor_index(similarity_matrix.index, counts, indices, scores, n_neighbors)
+    
+    def _get_neighbors(self, item_id):
+        """
+        Get the neighbor positions and scores of an item as O(K) slices of the index
+        """
+        idx = self.item_index[item_id]
+        start, stop = self.neighbor_indptr[idx], self.neighbor_indptr[idx + 1]
+        return self.neighbor_indices[start:stop], self.dequantize_scores(self.neighbor_scores[start:stop])
+    
+    def get_neighbor_count(self, item_id):
+        """
+        Number of positively correlated neighbors stored for an item
+        """
+        if not self.has_item(item_id):
+            return 0
+        idx = self.item_index[item_id]
+        return int(self.neighbor_indptr[idx + 1] - self.neighbor_indptr[idx])
+    
+    def _predict_known_rating(self, user_id, item_id, k=10):
+        """
+        Predict rating for a user-item pair using item-based CF
+        """
+        return self._predict_from_ratings(self._get_user_ratings(user_id), item_id, k)
+    
+    def _predict_from_ratings(self, user_ratings, item_id, k=10):
+        """
+        Predict a rating from a user's dense rating vector (aligned with item_ids)
+        """
+        if not (user_ratings > 0).any():
             return self.item_means.get(item_id, 3.0)
         
-        # Select top-k most similar items
-        if len(similarities) > k:
-            top_k_indices = np.argsort(similarities)[-k:]
-            similarities = [similarities[i] for i in top_k_indices]
-            weighted_ratings = [weighted_ratings[i] for i in top_k_indices]
+        # Neighbors are positive correlations sorted by strength, so the
+        # top-k most similar rated items are the first k rated neighbors
+        neighbors, scores = self._get_neighbors(item_id)
+        neighbor_ratings = user_ratings[neighbors]
+        rated = neighbor_ratings > 0
+        similarities = scores[rated][:k].astype(np.float64)
+        weighted_ratings = similarities * neighbor_ratings[rated][:k]
+        
+        if len(similarities) == 0:
+            return self.item_means.get(item_id, 3.0)
         
         # Calculate predicted rating
-        if sum(similarities) == 0:
+        if similarities.sum() == 0:
             return self.item_means.get(item_id, 3.0)
         
-        predicted_rating = sum(weighted_ratings) / sum(similarities)
+        predicted_rating = weighted_ratings.sum() / similarities.sum()
         
         # Ensure rating is within valid range [1, 5]
         return max(1.0, min(5.0, predicted_rating))
     
+    def _predict_all_from_ratings(self, user_ratings, k=10):
+        """
+        Predict the ratings of every item from a user's dense rating vector
+        
+        Same result as _predict_from_ratings for each item. The entries of the
+        neighbor index whose neighbor the user rated are gathered through the
+        reverse neighbor index, so the work grows with the user's ratings times
+        their neighbor lists instead of the whole index. Sorted back into entry
+        order they keep each item's neighbors strongest first; the first k per item
+        are selected and the weighted averages come from one bincount pass.
+        """
+        n_items = len(self.item_ids)
+        item_means = self._get_item_mean_values()
+        rated_items = np.flatnonzero(user_ratings > 0)
+        if len(rated_items) == 0:
+            return item_means.copy()
+        
+        # Entries listing one of the rated items as a neighbor, in index order
+        starts = self.reverse_indptr[rated_items]
+        lengths = self.reverse_indptr[rated_items + 1] - starts
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        entries = np.sort(self.reverse_entries[offsets])
+        rows = self.neighbor_rows[entries]
+        
+        # Keep the first k rated neighbors of each item (rows are sorted)
+        use = np.arange(len(entries)) - np.searchsorted(rows, rows) < k
+        entries, rows = entries[use], rows[use]
+        
+        similarities = self.dequantize_scores(self.neighbor_scores[entries]).astype(np.float64)
+        neighbor_ratings = user_ratings[self.neighbor_indices[entries]]
+        weighted = np.bincount(rows, weights=similarities * neighbor_ratings, minlength=n_items)
+        total = np.bincount(rows, weights=similarities, minlength=n_items)
+        
+        predictions = item_means.copy()
+        has_neighbors = total != 0
+        predictions[has_neighbors] = np.clip(weighted[has_neighbors] / total[has_neighbors], 1.0, 5.0)
+        return predictions
+    
     def get_item_recommendations(self, user_id, n_recommendations=10, k=10):
         """
         Get item recommendations for a user
         """
-        if user_id not in self.user_item_matrix.index:
+        if user_id not in self.user_index:
             # For new users, recommend popular items
-            item_popularity = self.ratings_df.groupby('product_id')['rating'].agg(['count', 'mean'])
-            item_popularity['score'] = item_popularity['count'] * item_popularity['mean']
-            top_items = item_popularity.nlargest(n_recommendations, 'score').index.tolist()
+            top_items = self.get_popular_items(n_recommendations).index.tolist()
             return self._format_recommendations(top_items)
         
-        # Get user's rated items
-        user_ratings = self.user_item_matrix.loc[user_id]
-        rated_items = set(user_ratings[user_ratings > 0].index)
+        # Predict ratings for all items at once and rank the unrated ones
+        user_ratings = self._get_user_ratings(user_id)
+        predictions = self._predict_all_from_ratings(user_ratings, k)
+        unrated = np.flatnonzero(user_ratings == 0)
         
-        # Get all items not rated by the user
-        all_items = set(self.user_item_matrix.columns)
-        unrated_items = all_items - rated_items
+        top = top_k(predictions[unrated], n_recommendations)
+        top_items = self.item_ids[unrated[top]].tolist()
         
-        # Predict ratings for unrated items
-        predictions = []
-        for item_id in unrated_items:
-            predicted_rating = self.predict_rating(user_id, item_id, k)
-            predictions.append((item_id, predicted_rating))
+        return self._format_recommendations(top_items)
+    
+    def _recommend_user_block(self, operands, item_means, user_rows, n, k):
+        """
+        Top-n recommendations for a block of users (positions in user_ids)
         
-        # Sort by predicted rating and get top recommendations
-        predictions.sort(key=lambda x: x[1], reverse=True)
-        top_items = [item_id for item_id, _ in predictions[:n_recommendations]]
+        The block's ratings are multiplied with a 0/1 selection matrix that maps
+        every item to its entries in the neighbor index, which gathers each user's
+        ratings of every item's neighbors in one sparse product. The first k rated
+        neighbors per (user, item) are kept and the weighted averages are summed
+        with bincount, matching _predict_all_from_ratings for each user.
         
-        return self._format_recommendations(top_items)
+        Returns:
+            Tuple of (recommendation counts per user, item positions, scores)
+        """
+        ratings = operands['ratings'][user_rows]
+        neighbors = operands['neighbors']
+        n_users, n_items = len(user_rows), neighbors.shape[0]
+        
+        gathered = ratings @ operands['selection']
+        gathered.sort_indices()
+        gathered = gathered.tocoo()
+        users, entries, neighbor_ratings = gathered.row, gathered.col, gathered.data
+        
+        # Entries of one (user, item) group are contiguous and in neighbor order
+        items = np.searchsorted(neighbors.indptr, entries, side='right') - 1
+        groups = users.astype(np.int64) * n_items + items
+        group_starts = np.flatnonzero(np.concatenate(([True], groups[1:] != groups[:-1])))
+        group_sizes = np.diff(np.append(group_starts, len(groups)))
+        rank = np.arange(len(groups)) - np.repeat(group_starts, group_sizes)
+        use = rank < k
+        
+        similarities = neighbors.data[entries[use]]
+        weighted = np.bincount(groups[use], weights=similarities * neighbor_ratings[use],
+                               minlength=n_users * n_items).reshape(n_users, n_items)
+        total = np.bincount(groups[use], weights=similarities,
+                            minlength=n_users * n_items).reshape(n_users, n_items)
+        
+        predictions = np.broadcast_to(item_means, (n_users, n_items)).copy()
+        has_neighbors = total != 0
+        predictions[has_neighbors] = np.clip(weighted[has_neighbors] / total[has_neighbors], 1.0, 5.0)
+        
+        # Rated items are never recommended
+        rated_users, rated_items = ratings.nonzero()
+        predictions[rated_users, rated_items] = -np.inf
+        
+        users, items = top_k_per_row(predictions, n)
+        return np.bincount(users, minlength=n_users), items.astype(np.int32), predictions[users, items]
     
-    def _format_recommendations(self, item_ids):
-        """
-        Format recommendations with item details
-        """
-        recommendations = []
-        for item_id in item_ids:
-            if item_id in self.items_data.index:
-                item_info = self.items_data.loc[item_id]
-                recommendations.append({
-                    'item_id': item_id,
-                    'name': item_info.get('productDisplayName', f'Item {item_id}'),
-                    'category': item_info.get('masterCategory', 'Unknown'),
-                    'subcategory': item_info.get('subCategory', 'Unknown'),
-                    'article_type': item_info.get('articleType', 'Unknown'),
-                    'color': item_info.get('baseColour', 'Unknown'),
-                    'gender': item_info.get('gender', 'Unknown')
-                })
-            else:
-                recommendations.append({
-                    'item_id': item_id,
-                    'name': f'Item {item_id}',
-                    'category': 'Unknown',
-                    'subcategory': 'Unknown',
-                    'article_type': 'Unknown',
-                    'color': 'Unknown',
-                    'gender': 'Unknown'
-                })
-        return recommendations
+    def _run_recommendation_blocks(self, operands, item_means, blocks, n, k, n_jobs):
+        """
+        Process the user blocks in order, either in this process or in a process
+        pool attached to the scoring operands through shared memory.
+        
+        Yields:
+            Tuples of (recommendation counts per user, item positions, scores)
+        """
+        if n_jobs <= 1:
+            for user_rows in blocks:
+                yield self._recommend_user_block(operands, item_means, user_rows, n, k)
+            return
+        
+        segments, spec = _share_operands(operands)
+        try:
+            with multiprocessing.Pool(n_jobs, initializer=_attach_recommendation_operands,
+                                      initargs=(spec, item_means)) as pool:
+                tasks = ((user_rows, n, k) for user_rows in blocks)
+                for result in pool.imap(_compute_recommendation_block, tasks):
+                    yield result
+        finally:
+            for segment in segments:
+                segment.close()
+                segment.unlink()
+    
+    def recommend_batch(self, user_ids=None, n=10, k=10, output_path=None, block_size=None, n_jobs=1,
+                        max_block_bytes=512 * 1024**2):
+        """
+        Recommend n items for many users at once
+        
+        Users are scored in blocks with sparse matrix products, and with n_jobs > 1
+        (or -1 for all cores) the blocks are spread over a process pool. A block
+        holds dense users x items arrays of about BATCH_BYTES_PER_PAIR bytes per
+        pair, so unless block_size is given it is sized for the blocks of all
+        workers to fit in max_block_bytes. Each user gets the same items as
+        get_item_recommendations; users unknown to the model get the popular items,
+        listed after the known users.
+        
+        Args:
+            user_ids: Users to recommend for (all users of the model when None)
+            n: Number of recommendations per user
+            k: Number of rated neighbors used for each prediction
+            output_path: CSV or Parquet (.parquet) file the rows are streamed to
+            block_size: Number of users scored together (derived from max_block_bytes when None)
+            n_jobs: Number of worker processes
+            max_block_bytes: Memory budget of the blocks scored at the same time
+            
+        Returns:
+            Structured array with user_id, rank, item_id and score fields, or the
+            output path when the rows were written to a file
+        """
+        if self.neighbor_indptr is None:
+            raise ValueError("Model not trained. Call build_item_similarity_matrix() first.")
+        
+        user_ids = self.user_ids if user_ids is None else np.asarray(user_ids)
+        positions = self.user_index.positions(user_ids)
+        known = positions >= 0
+        print(f"Recommending {n} items for {len(user_ids):,} users "
+              f"({int((~known).sum()):,} unknown to the model)")
+        
+        n_items = len(self.item_ids)
+        operands = {
+            'ratings': self.user_item_matrix,
+            'neighbors': csr_matrix((self.dequantize_scores(self.neighbor_scores).astype(np.float64),
+                                     self.neighbor_indices, self.neighbor_indptr),
+                                    shape=(n_items, n_items)),
+            'selection': csr_matrix((np.ones(len(self.neighbor_indices)),
+                                     (self.neighbor_indices, np.arange(len(self.neighbor_indices)))),
+                                    shape=(n_items, len(self.neighbor_indices)))
+        }
+        item_means = self._get_item_mean_values()
+        
+        known_rows = positions[known]
+        if n_jobs is None or n_jobs < 1:
+            n_jobs = os.cpu_count() or 1
+        if block_size is None:
+            block_size = max(int(max_block_bytes // (n_jobs * self.BATCH_BYTES_PER_PAIR * max(n_items, 1))), 1)
+            print(f"Scoring blocks of {block_size:,} users")
+        blocks = [known_rows[start:start + block_size] for start in range(0, len(known_rows), block_size)]
+        n_jobs = min(n_jobs, max(len(blocks), 1))
+        
+        writer = _RecommendationWriter(output_path)
+        try:
+            written = 0
+            for user_rows, (counts, items, scores) in zip(
+                    blocks, self._run_recommendation_blocks(operands, item_means, blocks, n, k, n_jobs)):
+                ranks = np.arange(len(items)) - np.repeat(np.cumsum(counts) - counts, counts) + 1
+                writer.write(np.repeat(self.user_ids[user_rows], counts), ranks,
+                             self.item_ids[items], scores)
+                written += len(user_rows)
+                print(f"Recommended for {written:,}/{len(known_rows):,} users")
+            
+            unknown_users = user_ids[~known]
+            if len(unknown_users) > 0:
+                popular = self.get_popular_items(n)
+                writer.write(np.repeat(unknown_users, len(popular)),
+                             np.tile(np.arange(1, len(popular) + 1), len(unknown_users)),
+                             np.tile(popular.index.values, len(unknown_users)),
+                             np.tile(popular.values, len(unknown_users)))
+        finally:
+            result = writer.close()
+        
+        if output_path is not None:
+            print(f"Recommendations saved to {output_path}")
+        return result
     
     def get_similar_items(self, item_id, n_similar=10):
         """
         Get items similar to a given item
         """
-        if item_id not in self.item_similarity_matrix.index:
+        if not self.has_item(item_id):
             return []
         
-        # Get similarities for the item
-        similarities = self.item_similarity_matrix.loc[item_id]
+        # Neighbors are already sorted by similarity (excluding the item itself)
+        neighbors, _ = self._get_neighbors(item_id)
+        similar_items = self.item_ids[neighbors[:n_similar]]
         
-        # Sort by similarity (excluding the item itself)
-        similar_items = similarities.drop(item_id).nlargest(n_similar)
-        
-        return self._format_recommendations(similar_items.index.tolist())
+        return self._format_recommendations(similar_items.tolist())
     
     def find_similar_items(self, item_id, n_similar=10):
         """
@@ -378,79 +1360,661 @@ class ItemBasedCollaborativeFiltering:
         Returns list of tuples: [(item_id, correlation_score), ...]
         Returns items sorted by correlation strength (highest first)
         """
-        if item_id not in self.item_similarity_matrix.index:
+        if not self.has_item(item_id):
             return []
         
-        # Get similarities for the item
-        similarities = self.item_similarity_matrix.loc[item_id]
-        
-        # Exclude the item itself, perfect correlations (1.0000), zero correlations, and negative correlations
-        filtered_similarities = similarities[
-            (similarities.index != item_id) & 
-            (similarities < 1.0) &   # Exclude perfect correlations
-            (similarities != 0.0) &  # Exclude zero correlations
-            (similarities > 0.0)     # Only positive correlations
-        ]
+        # The neighbor index only holds positive correlations with other items,
+        # already sorted in descending order
+        neighbors, scores = self._get_neighbors(item_id)
         
-        # Sort correlation values in descending order (highest positive correlation first)
-        similar_items = filtered_similarities.sort_values(ascending=False)
+        # Exclude perfect correlations
+        valid = scores < 1.0
+        neighbors, scores = neighbors[valid][:n_similar], scores[valid][:n_similar]
         
         # Return top N similar items with their positive correlation scores
-        top_items = similar_items.head(n_similar)
-        return [(item_id, float(score)) for item_id, score in top_items.items()]
+        return [(item_id, float(score)) for item_id, score in zip(self.item_ids[neighbors].tolist(), scores)]
     
+    @profiled_phase('save_model')
     def save_model(self, model_path):
         """
-        Save the trained model
+        Save the trained model as a directory artifact
+        
+        Every array (neighbor index, rating matrix, id maps, item means, popularity
+        ranking, pair statistics) is written as a .npy file and described in a small
+        manifest.json; item metadata goes to items.csv. Nothing is pickled, so
+        load_model can memory-map the arrays.
         """
-        model_data = {
-            'item_similarity_matrix': self.item_similarity_matrix,
-            'user_item_matrix': self.user_item_matrix,
-            'item_means': self.item_means,
-            'items_data': self.items_data
+        arrays = {
+            'neighbor_indptr': self.neighbor_indptr,
+            'neighbor_indices': self.neighbor_indices,
+            'neighbor_scores': self.neighbor_scores,
+            'neighbor_rows': self.neighbor_rows,
+            'reverse_indptr': self.reverse_indptr,
+            'reverse_entries': self.reverse_entries
         }
+        if self.pair_statistics is not None:
+            for name in self.PAIR_STATISTICS:
+                matrix = self.pair_statistics[name]
+                arrays[f'statistics_{name}_data'] = matrix.data
+                arrays[f'statistics_{name}_indices'] = matrix.indices
+                arrays[f'statistics_{name}_indptr'] = matrix.indptr
+        
+        self._write_artifact(model_path, 'item_based_cf', arrays, {
+            'n_neighbors': int(self.n_neighbors),
+            'precision': self.precision,
+            'score_scale': self.score_scale,
+            'pair_statistics': self.pair_statistics is not None,
+            'build_info': self.build_info
+        })
+    
+    def _load_artifact(self, model_path):
+        """
+        Load a directory artifact written by save_model, memory-mapping the arrays
+        """
+        manifest, load = self._read_artifact(model_path, 'item_based_cf')
+        
+        self.neighbor_indptr = load('neighbor_indptr')
+        self.neighbor_indices = load('neighbor_indices')
+        self.neighbor_scores = load('neighbor_scores')
+        if 'reverse_entries' in manifest['arrays']:
+            self._set_reverse_neighbor_index(load('neighbor_rows'), load('reverse_indptr'), load('reverse_entries'))
+        else:
+            # Artifacts written before the reverse index was stored
+            self._set_reverse_neighbor_index()
+        self.n_neighbors = manifest['n_neighbors']
+        self.precision = manifest['precision']
+        self.score_scale = manifest['score_scale']
+        self.build_info = manifest.get('build_info')
         
-        with open(model_path, 'wb') as f:
-            pickle.dump(model_data, f)
+        self.pair_statistics = None
+        if manifest['pair_statistics']:
+            n_items = len(self.item_ids)
+            self.pair_statistics = {
+                name: csr_matrix((load(f'statistics_{name}_data'), load(f'statistics_{name}_indices'),
+                                  load(f'statistics_{name}_indptr')), shape=(n_items, n_items), copy=False)
+                for name in self.PAIR_STATISTICS
+            }
         
-        print(f"Model saved to {model_path}")
+        print(f"Model loaded from {model_path}")
+        return self
     
     def load_model(self, model_path):
         """
-        Load a trained model
+        Load a trained model from a directory artifact, or from an older pickle file
         """
+        if os.path.isdir(model_path):
+            return self._load_artifact(model_path)
+        
         with open(model_path, 'rb') as f:
             model_data = pickle.load(f)
         
-        self.item_similarity_matrix = model_data['item_similarity_matrix']
-        self.user_item_matrix = model_data['user_item_matrix']
+        # Pickled model files store the dense similarity matrix
+        self._neighbor_index_from_dense(model_data['item_similarity_matrix'])
+        if isinstance(model_data['user_item_matrix'], pd.DataFrame):
+            # Older model files store a dense pivot table
+            ratings = model_data['user_item_matrix'].reindex(columns=self.item_ids, fill_value=0)
+            self.user_ids = ratings.index.values
+            self._set_user_item_matrix(csr_matrix(ratings.values))
+        else:
+            self.user_ids = model_data['user_ids']
+            self._set_user_item_matrix(model_data['user_item_matrix'])
+        self.user_index = _IdIndex.from_ids(self.user_ids)
         self.item_means = model_data['item_means']
-        self.items_data = model_data['items_data']
+        self._item_mean_values = None
+        self._set_items_data(model_data['items_data'])
+        if 'item_popularity' in model_data:
+            self.item_popularity = model_data['item_popularity']
+            self.popularity_segments = model_data['popularity_segments']
+        else:
+            # Older model files have no popularity ranking; rank from the stored ratings
+            self.item_popularity = None
+            self._update_popularity(self.item_ids[self.user_item_matrix.indices], self.user_item_matrix.data)
         
         print(f"Model loaded from {model_path}")
         return self
     
-    def train(self, ratings_path, styles_path, sample_size=50000, use_enhanced_dataset=True):
+    def fit(self, **options):
         """
-        Complete training pipeline
+        Train on the loaded ratings: build the top-K neighbor index, passing
+        options (keep_statistics, n_jobs, use_lsh, checkpoint_dir, kernel, ...)
+        to build_item_similarity_matrix
+        
+        With checkpoint_dir the similarity build resumes from the blocks a previous
+        run on the same data completed (see build_item_similarity_matrix).
         """
-        print("Training Item-Based Collaborative Filtering Model...")
+        return self.build_item_similarity_matrix(**options)
+    
+    def update(self, ratings_delta_path, chunk_size=500000):
+        """
+        Update the trained model with new ratings instead of retraining from scratch
+        
+        The delta file has the same columns as user_ratings.csv; a new rating for a
+        user-item pair that already exists replaces the old one (in the popularity
+        statistics too, where a pair rated several times before counts as one
+        rating of its mean). The contributions of
+        the users in the delta are swapped in the stored pair statistics, and only the
+        neighbor lists of items those users rated are recomputed.
+        """
+        if self.pair_statistics is None:
+            raise ValueError("Model must be trained with keep_statistics=True to support incremental updates")
+        
+        print(f"Updating model from {ratings_delta_path}...")
+        user_ids, item_ids, ratings = self._read_ratings(ratings_delta_path, chunk_size=chunk_size)
+        if len(user_ids) == 0:
+            print("No new ratings found")
+            return self
         
-        # Use enhanced dataset if available and requested
-        if use_enhanced_dataset:
-            enhanced_path = ratings_path.replace('.csv', '_enhanced.csv')
-            if os.path.exists(enhanced_path):
-                print(f"Using enhanced dataset: {enhanced_path}")
-                ratings_path = enhanced_path
-            else:
-                print(f"Enhanced dataset not found at {enhanced_path}, using original dataset")
+        # Extend the index maps with new users and items
+        new_users = np.unique(user_ids[~np.isin(user_ids, self.user_ids)])
+        new_items = np.unique(item_ids[~np.isin(item_ids, self.item_ids)])
+        if len(new_users) > 0:
+            self.user_ids = np.concatenate([self.user_ids, new_users.astype(self.user_ids.dtype)])
+            self.user_index = _IdIndex.from_ids(self.user_ids)
+        if len(new_items) > 0:
+            self.item_ids = np.concatenate([self.item_ids, new_items.astype(self.item_ids.dtype)])
+            self.item_index = _IdIndex.from_ids(self.item_ids)
+        n_users, n_items = len(self.user_ids), len(self.item_ids)
+        print(f"Delta: {len(user_ids)} ratings, {len(new_users)} new users, {len(new_items)} new items")
         
-        self.load_data(ratings_path, styles_path, sample_size)
-        self.build_item_similarity_matrix()
+        # Delta ratings matrix (repeated ratings of the same pair are averaged)
+        user_codes = pd.Index(self.user_ids).get_indexer(user_ids)
+        item_codes = pd.Index(self.item_ids).get_indexer(item_ids)
+        delta = csr_matrix((ratings.astype(np.float64), (user_codes, item_codes)), shape=(n_users, n_items))
+        delta_counts = csr_matrix((np.ones(len(user_codes)), (user_codes, item_codes)), shape=(n_users, n_items))
+        delta.sum_duplicates()
+        delta_counts.sum_duplicates()
+        delta.data /= delta_counts.data
         
-        print("Training completed!")
+        # Replace the touched users' ratings
+        self.user_item_matrix.resize((n_users, n_items))
+        touched_users = np.unique(user_codes)
+        old_rows = self.user_item_matrix[touched_users]
+        replaced = old_rows.multiply(delta_counts[touched_users].astype(bool)).tocoo()
+        self._set_user_item_matrix(
+            self.user_item_matrix - self.user_item_matrix.multiply(delta_counts.astype(bool)) + delta
+        )
+        new_rows = self.user_item_matrix[touched_users]
+        
+        # Swap the touched users' contributions in the pair statistics
+        old_statistics = self._pair_statistics_block(self._prepare_rating_operands(old_rows), 0, n_items)
+        new_statistics = self._pair_statistics_block(self._prepare_rating_operands(new_rows), 0, n_items)
+        updated = {}
+        for name in self.PAIR_STATISTICS:
+            statistic = self.pair_statistics[name].tocsr()
+            statistic.resize((n_items, n_items))
+            updated[name] = statistic - old_statistics[name] + new_statistics[name]
+        
+        # Keep the statistics aligned on the pairs that still have common raters
+        co_rated = updated['count'] > 0.5
+        for name in self.PAIR_STATISTICS:
+            statistic = updated[name].multiply(co_rated).tocsr()
+            statistic.sort_indices()
+            updated[name] = statistic
+        self.pair_statistics = updated
+        
+        # Recompute the neighbor lists of the touched items only
+        touched_items = np.unique(np.concatenate([old_rows.indices, new_rows.indices]))
+        block = self._pearson_block_from_statistics({
+            name: statistic[touched_items] for name, statistic in self.pair_statistics.items()
+        })
+        counts, indices, scores = self._top_k_neighbors(block, touched_items, self.n_neighbors)
+        
+        # Merge the recomputed lists into the existing neighbor index
+        old_counts = np.zeros(n_items, dtype=np.int64)
+        old_counts[:len(self.neighbor_indptr) - 1] = np.diff(self.neighbor_indptr)
+        old_rows_of_entries = np.repeat(np.arange(n_items), old_counts)
+        keep = ~np.isin(old_rows_of_entries, touched_items)
+        entry_rows = np.concatenate([old_rows_of_entries[keep], np.repeat(touched_items, counts)])
+        order = np.argsort(entry_rows, kind='stable')
+        self._set_neighbor_index(
+            self.item_ids,
+            np.bincount(entry_rows, minlength=n_items),
+            np.concatenate([self.neighbor_indices[keep], indices])[order],
+            np.concatenate([self.dequantize_scores(self.neighbor_scores[keep]), scores])[order],
+            self.n_neighbors
+        )
+        
+        self._compute_item_means()
+        self._update_popularity(item_ids, ratings, self.item_ids[replaced.col], replaced.data)
+        
+        print(f"Update completed! Recomputed neighbors for {len(touched_items)} of {n_items} items")
         return self
 
+# Rating operands attached by the similarity build worker processes
+_worker_operands = None
+_worker_segments = None
+_worker_item_means = None
+
+def _share_operands(operands):
+    """
+    Copy the arrays of the sparse rating operands into shared memory segments.
+    Index arrays reused by several operands are shared only once.
+    
+    Returns:
+        Tuple of (shared memory segments, spec for _attach_shared_operands)
+    """
+    segments = []
+    shared = {}
+    spec = {}
+    for name, matrix in operands.items():
+        arrays = []
+        for array in (matrix.data, matrix.indices, matrix.indptr):
+            if id(array) not in shared:
+                segment = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+                np.ndarray(array.shape, dtype=array.dtype, buffer=segment.buf)[:] = array
+                segments.append(segment)
+                shared[id(array)] = (segment.name, array.dtype.str, len(array))
+            arrays.append(shared[id(array)])
+        spec[name] = (matrix.format, matrix.shape, arrays)
+    return segments, spec
+
+def _attach_shared_operands(spec):
+    """
+    Pool initializer: rebuild the sparse rating operands on top of shared memory (no copies)
+    """
+    global _worker_operands, _worker_segments
+    _worker_segments = {}
+    _worker_operands = {}
+    for name, (matrix_format, shape, arrays) in spec.items():
+        parts = []
+        for segment_name, dtype, length in arrays:
+            if segment_name not in _worker_segments:
+                _worker_segments[segment_name] = shared_memory.SharedMemory(name=segment_name)
+            parts.append(np.ndarray((length,), dtype=dtype, buffer=_worker_segments[segment_name].buf))
+        matrix_class = csc_matrix if matrix_format == 'csc' else csr_matrix
+        _worker_operands[name] = matrix_class(tuple(parts), shape=shape, copy=False)
+
+def _compute_similarity_tile(task):
+    """
+    Pool task: compute one item tile against the shared rating operands
+    """
+    start, stop, n_neighbors, keep_statistics, kernel = task
+    tile_start = time.process_time()
+    result = ItemBasedCollaborativeFiltering()._similarity_tile(
+        _worker_operands, start, stop, n_neighbors, keep_statistics, kernel
+    )
+    return (start,) + result + (time.process_time() - tile_start,)
+
+def _attach_recommendation_operands(spec, item_means):
+    """
+    Pool initializer: attach the shared scoring operands and keep the item means
+    """
+    global _worker_item_means
+    _attach_shared_operands(spec)
+    _worker_item_means = item_means
+
+def _compute_recommendation_block(task):
+    """
+    Pool task: recommend for one block of users against the shared scoring operands
+    """
+    user_rows, n, k = task
+    return ItemBasedCollaborativeFiltering()._recommend_user_block(
+        _worker_operands, _worker_item_means, user_rows, n, k
+    )
+
+def _synthetic_ratings(n_users, n_items, density, random_state):
+    """
+    Random 1-5 ratings of a small synthetic fixture as a dense users x items
+    array, with a density fraction of the pairs rated (0 = not rated)
+    """
+    rng = np.random.RandomState(random_state)
+    values = rng.randint(1, 6, size=(n_users, n_items)).astype(float)
+    values[rng.rand(n_users, n_items) > density] = 0
+    return values
+
+def _synthetic_rating_model(values, item_ids):
+    """
+    Model whose user-item matrix holds the rated entries of a dense fixture,
+    with item_ids naming its columns
+    """
+    users, items = np.nonzero(values)
+    model = ItemBasedCollaborativeFiltering()
+    model._build_user_item_matrix(users, np.asarray(item_ids)[items], values[users, items])
+    return model
+
+def test_vectorized_similarity(n_users=60, n_items=25, density=0.3, random_state=42):
+    """
+    Check the vectorized similarity engine against the per-pair
+    calculate_pearson_correlation on a small synthetic fixture.
+    
+    Args:
+        n_users: Number of users in the fixture
+        n_items: Number of items in the fixture
+        density: Fraction of user-item pairs that carry a rating
+        random_state: Seed for the fixture
+    """
+    print("Testing vectorized Pearson similarity engine")
+    print("=" * 50)
+    
+    values = _synthetic_ratings(n_users, n_items, density, random_state)
+    
+    # Identical constant patterns and constant but different patterns
+    values[:, 1] = 0
+    values[:, 2] = 0
+    values[:4, 1] = 4
+    values[:4, 2] = 4
+    values[:4, 3] = 2
+    
+    ratings = pd.DataFrame(values, columns=[f"item_{i}" for i in range(n_items)])
+    model = _synthetic_rating_model(values, ratings.columns)
+    model.build_item_similarity_matrix(n_neighbors=n_items)
+    
+    operands = model._prepare_rating_operands(model.user_item_matrix)
+    similarities = model._pearson_similarity_block(operands, 0, n_items).toarray()
+    
+    max_difference = 0.0
+    for i, item1 in enumerate(ratings.columns):
+        expected_row = np.zeros(n_items)
+        for j, item2 in enumerate(ratings.columns):
+            if i != j:
+                expected_row[j] = model.calculate_pearson_correlation(ratings[item1], ratings[item2])
+                # Items without any rating are not part of the model
+                actual = 0.0
+                if model.has_item(item1) and model.has_item(item2):
+                    actual = similarities[model.item_index[item1], model.item_index[item2]]
+                difference = abs(actual - expected_row[j])
+                max_difference = max(max_difference, difference)
+        
+        # The neighbor index must hold exactly the positive correlations, strongest first
+        # (correlations within rounding error of zero may land on either side)
+        neighbors = [(item_id, score) for item_id, score in model.find_similar_items(item1, n_items) if score > 1e-9]
+        expected_neighbors = {ratings.columns[j] for j in np.nonzero(expected_row > 1e-9)[0]}
+        scores = [score for _, score in neighbors]
+        assert {item_id for item_id, _ in neighbors} == expected_neighbors, f"Neighbor index differs for {item1}"
+        assert scores == sorted(scores, reverse=True), f"Neighbors of {item1} are not sorted"
+    
+    print(f"Maximum difference from per-pair Pearson: {max_difference:.2e}")
+    assert max_difference < 1e-9, "Vectorized similarities differ from per-pair Pearson"
+    print("Vectorized engine matches per-pair Pearson!")
+    
+    # Whole-catalog predictions must match the per-item prediction
+    for user_id in model.user_ids:
+        user_ratings = model._get_user_ratings(user_id)
+        predictions = model._predict_all_from_ratings(user_ratings, k=5)
+        expected = [model._predict_from_ratings(user_ratings, item_id, k=5) for item_id in model.item_ids]
+        assert np.allclose(predictions, expected, rtol=0, atol=1e-12), f"Predictions differ for user {user_id}"
+    print("Whole-catalog predictions match per-item predictions!")
+    
+    # Limiting a loaded matrix to its most rated items keeps the means and the
+    # recommendations aligned with the retained items
+    max_items = n_items // 2
+    limited = _synthetic_rating_model(values, ratings.columns)
+    limited.build_item_similarity_matrix(n_neighbors=n_items, max_items=max_items)
+    limited._set_items_data(pd.DataFrame(index=pd.Index(limited.item_ids, name='id')))
+    assert len(limited.item_ids) == max_items == limited.user_item_matrix.shape[1]
+    for item_id in limited.item_ids:
+        item_ratings = ratings[item_id][ratings[item_id] > 0]
+        assert abs(limited.item_means[item_id] - item_ratings.mean()) < 1e-12, f"Mean of {item_id} differs"
+    for user_id in limited.user_ids:
+        recommendations = limited.get_item_recommendations(user_id, n_recommendations=5)
+        assert all(limited.has_item(rec['item_id']) for rec in recommendations), \
+            f"Limited model recommends a dropped item to user {user_id}"
+    print("Limited catalog keeps means and recommendations aligned!")
+
+def test_similarity_kernels(n_users=80, n_items=30, density=0.3, random_state=42):
+    """
+    Check every non-Pearson similarity kernel against a dense reference
+    computed item pair by item pair on a small synthetic fixture.
+    
+    Args:
+        n_users: Number of users in the fixture
+        n_items: Number of items in the fixture
+        density: Fraction of user-item pairs that carry a rating
+        random_state: Seed for the fixture
+    """
+    print("Testing vectorized similarity kernels")
+    print("=" * 50)
+    
+    values = _synthetic_ratings(n_users, n_items, density, random_state)
+    values[:, 0] = 0
+    values[:3, 0] = 5
+    
+    model = _synthetic_rating_model(values, np.arange(n_items))
+    values = values[:, model.item_ids]
+    rated = values > 0
+    
+    # Adjusted cosine centers each user's ratings on that user's mean rating
+    user_means = values.sum(axis=1) / np.maximum(rated.sum(axis=1), 1)
+    centered = np.where(rated, values - user_means[:, None], 0.0)
+    
+    def cosine(x, y):
+        norm = np.sqrt((x ** 2).sum() * (y ** 2).sum())
+        return (x * y).sum() / norm if norm > 0 else 0.0
+    
+    references = {
+        'cosine': lambda i, j: cosine(values[:, i], values[:, j]),
+        'adjusted_cosine': lambda i, j: cosine(centered[:, i], centered[:, j]),
+        'jaccard': lambda i, j: (rated[:, i] & rated[:, j]).sum() / (rated[:, i] | rated[:, j]).sum()
+    }
+    n_model_items = len(model.item_ids)
+    for kernel, reference in references.items():
+        operands = model._prepare_rating_operands(model.user_item_matrix, kernel)
+        kernel_method = getattr(model, model.SIMILARITY_KERNELS[kernel])
+        similarities = vstack([kernel_method(operands, start, min(start + 7, n_model_items))
+                               for start in range(0, n_model_items, 7)]).toarray()
+        expected = np.array([[reference(i, j) for j in range(n_model_items)] for i in range(n_model_items)])
+        max_difference = np.abs(similarities - expected).max()
+        print(f"{kernel}: maximum difference from the dense reference {max_difference:.2e}")
+        assert max_difference < 1e-9, f"The {kernel} kernel differs from its dense reference"
+        
+        # The blocked build must keep the strongest positive neighbors of each item
+        model.build_item_similarity_matrix(block_size=7, n_neighbors=5, kernel=kernel)
+        for i, item_id in enumerate(model.item_ids[:5]):
+            scores = [score for _, score in model.find_similar_items(item_id, 5)]
+            row = np.delete(expected[i], i)
+            expected_scores = np.sort(row[row > 0])[::-1][:5]
+            assert np.allclose(sorted(scores, reverse=True), expected_scores, atol=1e-6), \
+                f"Neighbors of item {item_id} differ for the {kernel} kernel"
+    print("All kernels match their dense references!")
+
+def test_metadata_similarity(styles_path="data/styles.csv", n_items=200):
+    """
+    Check the vectorized metadata similarity against the per-pair
+    calculate_metadata_similarity on items from the styles file.
+    
+    Args:
+        styles_path: Path to the styles CSV
+        n_items: Number of items compared pairwise
+    """
+    print("Testing vectorized metadata similarity")
+    print("=" * 50)
+    
+    model = ItemBasedCollaborativeFiltering()
+    model.items_data = pd.read_csv(styles_path).set_index('id')
+    # Include an id without metadata
+    item_ids = np.append(model.items_data.index.values[:n_items], -1)
+    
+    similarities = model.calculate_metadata_similarity_block(item_ids, item_ids)
+    expected = np.array([[model.calculate_metadata_similarity(item1, item2) for item2 in item_ids]
+                         for item1 in item_ids])
+    
+    assert np.array_equal(similarities, expected), "Vectorized metadata similarity differs"
+    print(f"Vectorized metadata similarity matches for {len(item_ids) ** 2:,} pairs!")
+
+def test_precision_agreement(ratings_path="data/user_ratings.csv", styles_path="data/styles.csv",
+                             n_users=200, n_recommendations=10, tolerance=1e-4):
+    """
+    Compare recommendations served from reduced-precision neighbor scores with
+    the float64 model.
+    
+    Predictions tie often, so agreement is also measured up to ties with the
+    float64 predictions (see ranking.top_k_agreement).
+    
+    Args:
+        ratings_path: Path to the ratings CSV
+        styles_path: Path to the styles CSV
+        n_users: Number of users whose recommendations are compared
+        n_recommendations: Number of recommendations per user
+        tolerance: Prediction difference treated as a tie
+        
+    Returns:
+        Dictionary of agreement statistics per precision
+    """
+    import copy
+    
+    print("Testing reduced-precision neighbor scores")
+    print("=" * 50)
+    
+    model = ItemBasedCollaborativeFiltering(precision='float64')
+    model.load_data(ratings_path, styles_path)
+    model.build_item_similarity_matrix()
+    users = model.user_ids[:n_users]
+    
+    def recommended_positions(recommender):
+        return [model.item_index.positions([rec['item_id'] for rec in
+                                            recommender.get_item_recommendations(user_id, n_recommendations)])
+                for user_id in users]
+    
+    expected = recommended_positions(model)
+    predictions = [model._predict_all_from_ratings(model._get_user_ratings(user_id)) for user_id in users]
+    
+    results = {}
+    for precision in ['float32', 'float16', 'int8']:
+        reduced = copy.copy(model).set_precision(precision)
+        assert (reduced.neighbor_scores != 0).all(), f"{precision} index stores zero scores"
+        results[precision] = {
+            'score_bytes': reduced.neighbor_scores.nbytes,
+            'reduction': model.neighbor_scores.nbytes / max(reduced.neighbor_scores.nbytes, 1),
+            **top_k_agreement(expected, recommended_positions(reduced), predictions, tolerance)
+        }
+        print(f"{precision}: {results[precision]['reduction']:.0f}x smaller scores, top-{n_recommendations} "
+              f"overlap {results[precision]['overlap']:.2%}, agreement up to ties {results[precision]['agreement']:.2%}")
+    
+    return results
+
+def benchmark_recommendation_latency(model=None, n_users=200, n_recommendations=10, n_items=44000,
+                                     n_neighbors=100, ratings_per_user=30, target_ms=10.0, random_state=42):
+    """
+    Measure the per-user latency of get_item_recommendations
+    
+    Without a model a synthetic one is built with n_items items, n_neighbors
+    random neighbors per item (scores sorted strongest first) and
+    ratings_per_user random ratings for each of n_users users, so a full-size
+    catalog can be measured without training on it.
+    
+    Args:
+        model: Trained model to measure (a synthetic model when None)
+        n_users: Number of users measured (and synthesized)
+        n_recommendations: Number of recommendations per user
+        n_items: Catalog size of the synthetic model
+        n_neighbors: Neighbors per item of the synthetic model
+        ratings_per_user: Ratings per user of the synthetic model
+        target_ms: Latency target the 95th percentile is compared against
+        random_state: Seed of the synthetic model
+        
+    Returns:
+        Dictionary of mean, 95th percentile and maximum milliseconds per user and
+        whether the 95th percentile is within target_ms
+    """
+    print("Benchmarking per-user recommendation latency")
+    print("=" * 50)
+    
+    if model is None:
+        rng = np.random.RandomState(random_state)
+        item_ids = np.arange(n_items)
+        users = np.repeat(np.arange(n_users), ratings_per_user)
+        ratings = csr_matrix((rng.randint(1, 6, size=len(users)).astype(np.float64),
+                              (users, rng.randint(0, n_items, size=len(users)))), shape=(n_users, n_items))
+        ratings.sum_duplicates()
+        
+        model = ItemBasedCollaborativeFiltering()
+        model.user_ids = np.arange(n_users)
+        model.user_index = _IdIndex(model.user_ids)
+        model.item_ids = item_ids
+        model.item_index = _IdIndex(item_ids)
+        model._set_user_item_matrix(ratings)
+        model._compute_item_means()
+        model._set_items_data(pd.DataFrame(index=pd.Index(item_ids, name='id')))
+        scores = -np.sort(-rng.uniform(0.01, 1.0, size=(n_items, n_neighbors)), axis=1)
+        model._set_neighbor_index(item_ids, np.full(n_items, n_neighbors),
+                                  rng.randint(0, n_items, size=n_items * n_neighbors).astype(np.int32),
+                                  scores.ravel(), n_neighbors)
+    
+    user_ids = model.user_ids[:n_users]
+    print(f"{len(model.item_ids):,} items, {len(model.neighbor_indices):,} neighbor entries, "
+          f"{len(user_ids)} users")
+    model.get_item_recommendations(user_ids[0], n_recommendations)
+    
+    latencies = []
+    for user_id in user_ids:
+        start = time.perf_counter()
+        model.get_item_recommendations(user_id, n_recommendations)
+        latencies.append((time.perf_counter() - start) * 1000)
+    
+    results = {
+        'mean_ms': float(np.mean(latencies)),
+        'p95_ms': float(np.percentile(latencies, 95)),
+        'max_ms': float(np.max(latencies)),
+    }
+    results['within_target'] = results['p95_ms'] < target_ms
+    print(f"Per-user latency: {results['mean_ms']:.2f} ms mean, {results['p95_ms']:.2f} ms p95, "
+          f"{results['max_ms']:.2f} ms max (target {target_ms:.0f} ms: "
+          f"{'met' if results['within_target'] else 'missed'})")
+    return results
+
+def test_artifact_update_roundtrip(ratings_path="data/user_ratings.csv", styles_path="data/styles.csv",
+                                   n_delta=300, n_users=50, random_state=42):
+    """
+    Load a saved model, update it with new ratings and save it back to the same
+    directory, then check that the reloaded artifact matches the updated model.
+    
+    The loaded model's arrays are memory-mapped from the files that the second
+    save replaces.
+    
+    Args:
+        ratings_path: Path to the ratings CSV
+        styles_path: Path to the styles CSV
+        n_delta: Number of existing ratings re-rated in the delta file
+        n_users: Number of users whose recommendations are compared
+        random_state: Seed of the re-rated sample
+    """
+    import tempfile
+    
+    print("Testing artifact update round trip")
+    print("=" * 50)
+    
+    model = ItemBasedCollaborativeFiltering()
+    model.load_data(ratings_path, styles_path)
+    model.build_item_similarity_matrix(keep_statistics=True)
+    
+    with tempfile.TemporaryDirectory() as directory:
+        model_path = os.path.join(directory, 'model')
+        model.save_model(model_path)
+        
+        # Re-rate pairs that occur once in the file, so the merged ratings are well defined
+        ratings = pd.read_csv(ratings_path, usecols=['user_id', 'product_id', 'rating'])
+        delta = ratings.drop_duplicates(['user_id', 'product_id'], keep=False)
+        delta = delta.sample(n_delta, random_state=random_state)
+        delta['rating'] = delta['rating'] % 5 + 1
+        delta_path = os.path.join(directory, 'delta.csv')
+        delta.to_csv(delta_path, index=False)
+        
+        loaded = ItemBasedCollaborativeFiltering().load_model(model_path)
+        loaded.update(delta_path)
+        loaded.save_model(model_path)
+        reloaded = ItemBasedCollaborativeFiltering().load_model(model_path)
+        
+        assert sorted(os.listdir(directory)) == ['delta.csv', 'model'], "Staging directories were left behind"
+        assert np.array_equal(reloaded.item_ids, loaded.item_ids)
+        assert np.array_equal(reloaded.user_ids, loaded.user_ids)
+        assert (reloaded.user_item_matrix != loaded.user_item_matrix).nnz == 0
+        for name in ['neighbor_indptr', 'neighbor_indices', 'neighbor_scores']:
+            assert np.array_equal(getattr(reloaded, name), getattr(loaded, name)), f"{name} differs"
+        
+        # Popularity counts the re-rated pairs once, with their new rating
+        merged = pd.concat([ratings.drop(delta.index), delta])
+        expected = merged.groupby('product_id')['rating'].agg(['count', 'sum'])
+        for popularity in [loaded.item_popularity, reloaded.item_popularity]:
+            popularity = popularity.sort_index()
+            assert np.array_equal(popularity.index, expected.index)
+            assert np.array_equal(popularity['count'], expected['count']), "Popularity counts differ"
+            assert np.allclose(popularity['sum'], expected['sum'], rtol=0, atol=1e-9), "Popularity sums differ"
+        for user_id in loaded.user_ids[:n_users]:
+            assert (reloaded.get_item_recommendations(user_id, 10) ==
+                    loaded.get_item_recommendations(user_id, 10)), f"Reloaded model differs for user {user_id}"
+    
+    print("Reloaded artifact matches the updated model!")
+
 # if __name__ == "__main__":
 #     # Example usage
 #     model = ItemBasedCollaborativeFiltering()
@@ -462,6 +2026,6 @@ class ItemBasedCollaborativeFiltering:
 #     model.train(ratings_path, styles_path)
     
 #     # Save the model
-#     model.save_model("models/item_based_cf_model.pkl")
+#     model.save_model("models/item_based_cf_model")
     
 #     print("Training completed!")
\ No newline at end of file
@@ -0,0 +1,138 @@
+import pandas as pd
+import numpy as np
+from pandas.api.types import is_numeric_dtype
+
+class ItemCatalog:
+    """
+    Array-backed item metadata store shared by the recommenders and the app.
+    
+    Item ids map to rows through a dense id -> row array (a dictionary when the
+    ids are not small non-negative integers). Text attributes are kept as integer
+    codes into per-column string tables and numeric attributes as plain arrays,
+    so single and batch lookups never materialize pandas rows.
+    """
+    
+    def __init__(self, items: pd.DataFrame):
+        """
+        Build the catalog from an items DataFrame.
+        
+        Args:
+            items: Item metadata with an 'id' column (or an index named 'id')
+        """
+        if 'id' not in items.columns:
+            items = items.reset_index()
+        
+        self.columns = list(items.columns)
+        self.ids = items['id'].to_numpy()
+        self.codes = {}
+        self.categories = {}
+        self.values = {}
+        for column in self.columns:
+            if column == 'id':
+                continue
+            series = items[column]
+            if is_numeric_dtype(series):
+                self.values[column] = series.to_numpy()
+            else:
+                # Missing values get code -1
+                codes, uniques = pd.factorize(series)
+                self.codes[column] = codes.astype(np.int32)
+                self.categories[column] = np.asarray(uniques, dtype=object)
+        
+        self._build_index()
+    
+    def _build_index(self):
+        """
+        Build the id -> row lookup; the first row of a duplicated id wins
+        """
+        n_items = len(self.ids)
+        self._row_array = None
+        self._row_dict = None
+        if (n_items > 0 and np.issubdtype(self.ids.dtype, np.integer)
+                and self.ids.min() >= 0 and self.ids.max() < 4 * n_items + 1024):
+            self._row_array = np.full(int(self.ids.max()) + 1, -1, dtype=np.int32)
+            self._row_array[self.ids[::-1]] = np.arange(n_items - 1, -1, -1, dtype=np.int32)
+        else:
+            self._row_dict = {}
+            for row, item_id in enumerate(self.ids.tolist()):
+                self._row_dict.setdefault(item_id, row)
+    
+    def __len__(self):
+        return len(self.ids)
+    
+    def __contains__(self, item_id):
+        return self.row(item_id) >= 0
+    
+    def row(self, item_id) -> int:
+        """
+        Row of a single item id (-1 when the item is unknown)
+        """
+        if self._row_array is None:
+            return self._row_dict.get(item_id, -1)
+        if isinstance(item_id, (int, np.integer)) and 0 <= item_id < len(self._row_array):
+            return int(self._row_array[item_id])
+        return -1
+    
+    def rows(self, item_ids) -> np.ndarray:
+        """
+        Rows of a batch of item ids (-1 for unknown items)
+        """
+        item_ids = np.asarray(item_ids)
+        if self._row_array is None or not np.issubdtype(item_ids.dtype, np.integer):
+            return np.array([self.row(item_id) for item_id in item_ids.tolist()], dtype=np.int64)
+        rows = np.full(item_ids.shape, -1, dtype=np.int64)
+        valid = (item_ids >= 0) & (item_ids < len(self._row_array))
+        rows[valid] = self._row_array[item_ids[valid]]
+        return rows
+    
+    def column(self, column: str, rows) -> np.ndarray:
+        """
+        Values of one attribute for a batch of rows (NaN for missing values)
+        """
+        rows = np.asarray(rows)
+        if column == 'id':
+            return self.ids[rows]
+        if column in self.values:
+            return self.values[column][rows]
+        codes = self.codes[column][rows]
+        values = np.full(codes.shape, np.nan, dtype=object)
+        present = codes >= 0
+        values[present] = self.categories[column][codes[present]]
+        return values
+    
+    def _row_dict_at(self, row: int) -> dict:
+        """
+        All attributes of one row as a dictionary
+        """
+        item = {}
+        for column in self.columns:
+            if column == 'id':
+                item[column] = self.ids[row]
+            elif column in self.values:
+                item[column] = self.values[column][row]
+            else:
+                code = self.codes[column][row]
+                item[column] = self.categories[column][code] if code >= 0 else np.nan
+        return item
+    
+    def get(self, item_id):
+        """
+        All attributes of an item as a dictionary, or None when the item is unknown
+        """
+        row = self.row(item_id)
+        if row < 0:
+            return None
+        return self._row_dict_at(row)
+    
+    def get_many(self, item_ids) -> list:
+        """
+        Attribute dictionaries for a batch of item ids (None for unknown items)
+        """
+        return [self._row_dict_at(row) if row >= 0 else None for row in self.rows(item_ids).tolist()]
+    
+    @classmethod
+    def from_csv(cls, path: str) -> 'ItemCatalog':
+        """
+        Build the catalog from a styles CSV file.
+        """
+        return cls(pd.read_csv(path, on_bad_lines='skip'))
@@ -0,0 +1,70 @@
+import numpy as np
+
+def top_k_per_row(scores, k):
+    """
+    Top k columns of every row of a 2-D score array, best first
+    
+    Only the columns tied with or above each row's k-th best score (found with
+    np.partition) are sorted, and ties go to the lower column. -inf scores are
+    never selected, so rows with fewer than k finite scores get fewer columns.
+    
+    Args:
+        scores: (n_rows, n_cols) score array
+        k: Number of columns kept per row
+    
+    Returns:
+        Tuple of (rows, cols) arrays ordered by row, then by rank within the row
+    """
+    n_cols = scores.shape[1]
+    if k <= 0 or n_cols == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty
+    
+    if k < n_cols:
+        # Keep everything tied with each row's k-th best so the tie order is preserved
+        thresholds = np.partition(scores, n_cols - k, axis=1)[:, n_cols - k]
+        candidates = (scores >= thresholds[:, np.newaxis]) & (scores > -np.inf)
+    else:
+        candidates = scores > -np.inf
+    rows, cols = np.nonzero(candidates)
+    
+    order = np.lexsort((cols, -scores[rows, cols], rows))
+    rows, cols = rows[order], cols[order]
+    keep = np.arange(len(rows)) - np.searchsorted(rows, rows) < k
+    return rows[keep], cols[keep]
+
+def top_k(scores, k):
+    """
+    Positions of the k highest scores of a 1-D array, highest first (ties go to
+    the lower position, -inf scores are never selected)
+    """
+    return top_k_per_row(np.asarray(scores)[np.newaxis], k)[1]
+
+def top_k_agreement(expected, actual, reference_scores, tolerance=1e-4):
+    """
+    Agreement of the top-n lists of a model under test with those of a reference
+    
+    Scores tie often (e.g. ratings capped at 5.0), so besides the plain overlap a
+    position also counts as agreeing when its reference score is within
+    tolerance of the reference n-th best score (the lowest reference score of
+    the expected list).
+    
+    Args:
+        expected: Reference top-n positions of every query
+        actual: Top-n positions of the model under test for the same queries
+        reference_scores: Reference scores of all positions for every query
+        tolerance: Score difference treated as a tie
+    
+    Returns:
+        Dictionary with the mean overlap and the mean agreement up to ties
+    """
+    overlaps = []
+    agreements = []
+    for expected_positions, actual_positions, scores in zip(expected, actual, reference_scores):
+        expected_positions = np.asarray(expected_positions, dtype=np.int64)
+        actual_positions = np.asarray(actual_positions, dtype=np.int64)
+        common = set(expected_positions.tolist()) & set(actual_positions.tolist())
+        overlaps.append(len(common) / max(len(expected_positions), 1))
+        threshold = scores[expected_positions].min() - tolerance
+        agreements.append(np.mean(scores[actual_positions] >= threshold))
+    return {'overlap': float(np.mean(overlaps)), 'agreement': float(np.mean(agreements))}
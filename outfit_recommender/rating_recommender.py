@@ -0,0 +1,782 @@
+import pandas as pd
+import numpy as np
+import json
+import os
+import shutil
+import tempfile
+from abc import ABC, abstractmethod
+from collections.abc import Mapping
+from scipy.sparse import csr_matrix
+from item_catalog import ItemCatalog
+from instrumentation import profiled_phase, record_counts
+
+class RatingRecommender(ABC):
+    """
+    Base class of the recommenders trained on the user ratings (item-based CF,
+    ALS, EASE)
+    
+    Provides the streamed ratings ingestion into a sparse user-item matrix with
+    id index maps, item means, the precomputed popularity ranking for cold-start
+    users, result formatting from the item catalog, the training pipeline and the
+    shared part of the directory artifact.
+    
+    Subclasses implement fit (train on the loaded ratings), _predict_known_rating,
+    save_model and _load_artifact, and serve get_item_recommendations,
+    recommend_batch, find_similar_items, get_similar_items and get_neighbor_count.
+    """
+    
+    # Version of the directory artifact written by save_model
+    ARTIFACT_VERSION = 1
+    
+    # Name printed by train()
+    MODEL_NAME = "Rating Model"
+    
+    def __init__(self, profiler=None):
+        # Sparse user-item rating matrix (CSR, users x items) with dense index maps
+        self.user_item_matrix = None
+        self.user_ids = None
+        self.user_index = None
+        self._item_ratings = None
+        self.item_ids = None
+        self.item_index = None
+        self.item_means = None
+        self._item_mean_values = None
+        self.item_popularity = None
+        self.popularity_segments = None
+        self.items_data = None
+        self._catalog = None
+        # Optional instrumentation.PhaseProfiler timing the training phases
+        self.profiler = profiler
+    
+    @profiled_phase('load_data')
+    def load_data(self, ratings_path, styles_path, sample_size=None, chunk_size=500000,
+                  max_items=None, max_tracked_items=1000000):
+        """
+        Load and preprocess the ratings and styles data
+        
+        Ratings are streamed in chunks with compact dtypes and stored as a sparse
+        user-item matrix, so the full ratings file can be used; pass sample_size
+        to train on a uniform random sample (reservoir sampling) instead.
+        
+        With max_items only the max_items most rated items are kept. Item rating
+        counts are gathered while the file is streamed (exactly while at most
+        max_tracked_items distinct items have been seen, with a SpaceSaving summary
+        of that size afterwards), so the matrix only ever covers the retained items.
+        """
+        print("Loading data...")
+        
+        # Stream ratings data, counting ratings per item when the catalog is limited
+        item_counter = None if max_items is None else _ItemFrequencyCounter(max_tracked_items)
+        user_ids, item_ids, ratings = self._read_ratings(
+            ratings_path, sample_size, chunk_size, item_counter=item_counter)
+        
+        if item_counter is not None and len(item_counter) > max_items:
+            retained = item_counter.top(max_items)
+            keep = np.isin(item_ids, retained)
+            counting = "exact counts" if item_counter.exact else f"SpaceSaving summary of {max_tracked_items} items"
+            print(f"Keeping the {max_items} most rated items ({counting}): "
+                  f"{int(keep.sum())} of {len(keep)} ratings retained")
+            user_ids, item_ids, ratings = user_ids[keep], item_ids[keep], ratings[keep]
+        
+        # Load styles data
+        self.styles_df = pd.read_csv(styles_path)
+        print(f"Loaded {len(self.styles_df)} items")
+        
+        # Create sparse user-item matrix
+        self._build_user_item_matrix(user_ids, item_ids, ratings)
+        print(f"Working with {len(self.user_ids)} users and {len(self.item_ids)} items")
+        print(f"User-item matrix shape: {self.user_item_matrix.shape} ({self.user_item_matrix.nnz:,} ratings)")
+        
+        # Store items data for recommendations
+        self._set_items_data(self.styles_df.set_index('id'))
+        
+        # Rank items by popularity once for cold-start recommendations
+        self.item_popularity = None
+        self._update_popularity(item_ids, ratings)
+        
+        record_counts(self, ratings=len(ratings), users=len(self.user_ids), items=len(self.item_ids))
+        return self
+    
+    def _read_ratings(self, ratings_path, sample_size=None, chunk_size=500000, random_state=42,
+                      item_counter=None):
+        """
+        Read the ratings CSV in chunks with compact dtypes (int32 ids, int8 ratings).
+        
+        Without sample_size every rating is appended to compact buffers. With sample_size
+        a single-pass reservoir sample is kept, so memory stays bounded by the sample
+        no matter how large the file is.
+        
+        An item_counter receives the product ids of every chunk (of the final sample
+        when sampling, since only sampled ratings reach the model).
+        
+        Returns:
+            Tuple of (user_ids, product_ids, ratings) arrays
+        """
+        reader = pd.read_csv(
+            ratings_path,
+            usecols=['user_id', 'product_id', 'rating'],
+            dtype={'user_id': np.int32, 'product_id': np.int32, 'rating': np.int8},
+            chunksize=chunk_size
+        )
+        
+        if sample_size is None:
+            buffers = ([], [], [])
+            total = 0
+            for chunk in reader:
+                for buffer, column in zip(buffers, ['user_id', 'product_id', 'rating']):
+                    buffer.append(chunk[column].to_numpy())
+                if item_counter is not None:
+                    item_counter.add(buffers[1][-1])
+                total += len(chunk)
+            print(f"Loaded {total} ratings")
+            if total == 0:
+                return (np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int8))
+            return tuple(np.concatenate(buffer) for buffer in buffers)
+        
+        rng = np.random.RandomState(random_state)
+        reservoir = (
+            np.zeros(sample_size, dtype=np.int32),
+            np.zeros(sample_size, dtype=np.int32),
+            np.zeros(sample_size, dtype=np.int8)
+        )
+        seen = 0
+        for chunk in reader:
+            columns = [chunk[column].to_numpy() for column in ['user_id', 'product_id', 'rating']]
+            
+            # Fill the reservoir first
+            filled = min(max(sample_size - seen, 0), len(chunk))
+            for slots, values in zip(reservoir, columns):
+                slots[seen:seen + filled] = values[:filled]
+            
+            # Row t (0-based over the whole file) replaces a random slot with probability sample_size / (t + 1)
+            positions = np.arange(seen + filled, seen + len(chunk))
+            slots_drawn = (rng.random_sample(len(positions)) * (positions + 1)).astype(np.int64)
+            replace = slots_drawn < sample_size
+            slots_drawn, rows = slots_drawn[replace], positions[replace] - seen
+            
+            # When several rows hit the same slot in one chunk, the last one wins
+            _, last = np.unique(slots_drawn[::-1], return_index=True)
+            last = len(slots_drawn) - 1 - last
+            for slots, values in zip(reservoir, columns):
+                slots[slots_drawn[last]] = values[rows[last]]
+            
+            seen += len(chunk)
+        
+        print(f"Loaded {seen} ratings")
+        if seen > sample_size:
+            print(f"Sampled {sample_size} ratings for training (reservoir sampling)")
+        sample = tuple(slots[:min(seen, sample_size)] for slots in reservoir)
+        if item_counter is not None:
+            item_counter.add(sample[1])
+        return sample
+    
+    @profiled_phase('build_user_item_matrix')
+    def _build_user_item_matrix(self, user_ids, item_ids, ratings):
+        """
+        Build the sparse user-item matrix and the user_id / product_id index maps.
+        Repeated ratings of the same user-item pair are averaged.
+        """
+        user_codes, self.user_ids = pd.factorize(user_ids, sort=True)
+        item_codes, item_ids = pd.factorize(item_ids, sort=True)
+        self.user_ids = np.asarray(self.user_ids)
+        self.item_ids = np.asarray(item_ids)
+        self.user_index = _IdIndex(self.user_ids)
+        self.item_index = _IdIndex(self.item_ids)
+        
+        shape = (len(self.user_ids), len(self.item_ids))
+        rating_sums = csr_matrix((np.asarray(ratings, dtype=np.float64), (user_codes, item_codes)), shape=shape)
+        rating_counts = csr_matrix((np.ones(len(user_codes)), (user_codes, item_codes)), shape=shape)
+        rating_sums.sum_duplicates()
+        rating_counts.sum_duplicates()
+        rating_sums.data /= rating_counts.data
+        
+        self._set_user_item_matrix(rating_sums)
+        record_counts(self, ratings=len(user_codes), stored_ratings=self.user_item_matrix.nnz)
+    
+    def _set_user_item_matrix(self, user_item_matrix):
+        """
+        Store the sparse user-item matrix and drop cached per-item views of it
+        """
+        self.user_item_matrix = csr_matrix(user_item_matrix)
+        self.user_item_matrix.eliminate_zeros()
+        self.user_item_matrix.sort_indices()
+        self._item_ratings = None
+    
+    def _get_user_ratings(self, user_id):
+        """
+        Get a user's ratings as a dense vector aligned with item_ids (0 = not rated)
+        """
+        return self.user_item_matrix[self.user_index[user_id]].toarray().ravel()
+    
+    def get_item_ratings(self, item_id):
+        """
+        Get the actual ratings of an item as a Series indexed by user_id
+        """
+        if not self.has_item(item_id):
+            return pd.Series(dtype=np.float64)
+        
+        # Column access goes through a lazily built CSC copy of the ratings
+        if self._item_ratings is None:
+            self._item_ratings = self.user_item_matrix.tocsc()
+        idx = self.item_index[item_id]
+        start, stop = self._item_ratings.indptr[idx], self._item_ratings.indptr[idx + 1]
+        return pd.Series(
+            self._item_ratings.data[start:stop],
+            index=self.user_ids[self._item_ratings.indices[start:stop]]
+        )
+    
+    def _set_items_data(self, items_data):
+        """
+        Store the item metadata (indexed by id) and drop lookups built from it
+        """
+        self.items_data = items_data
+        self._catalog = None
+    
+    def _get_catalog(self):
+        """
+        Array-backed lookup over items_data, built on first use
+        """
+        if self._catalog is None:
+            self._catalog = ItemCatalog(self.items_data)
+        return self._catalog
+    
+    def _compute_item_means(self):
+        """
+        Calculate the mean actual rating of every item (3.0 for items without ratings)
+        """
+        rating_counts = np.bincount(self.user_item_matrix.indices, minlength=len(self.item_ids))
+        rating_sums = np.bincount(self.user_item_matrix.indices, weights=self.user_item_matrix.data,
+                                  minlength=len(self.item_ids))
+        means = np.full(len(self.item_ids), 3.0)  # Default rating
+        means[rating_counts > 0] = rating_sums[rating_counts > 0] / rating_counts[rating_counts > 0]
+        self.item_means = _IdValues(self.item_index, means)
+        self._item_mean_values = means
+    
+    def has_item(self, item_id):
+        """
+        Check whether an item is part of the trained model
+        """
+        return self.item_index is not None and item_id in self.item_index
+    
+    def predict_rating(self, user_id, item_id, k=10):
+        """
+        Predict rating for a user-item pair
+        
+        Users unknown to the model get the item's mean rating and items unknown to
+        the model get the default rating; known pairs are scored by the model.
+        """
+        if user_id not in self.user_index:
+            return self.item_means.get(item_id, 3.0)  # Default rating
+        
+        if not self.has_item(item_id):
+            return 3.0  # Default rating
+        
+        return self._predict_known_rating(user_id, item_id, k)
+    
+    @abstractmethod
+    def _predict_known_rating(self, user_id, item_id, k=10):
+        """
+        Model prediction for a user and an item that are both in the model
+        """
+    
+    def _get_item_mean_values(self):
+        """
+        Item means as an array aligned with item_ids
+        """
+        if self._item_mean_values is None:
+            self._item_mean_values = np.array([self.item_means.get(item_id, 3.0) for item_id in self.item_ids],
+                                              dtype=float)
+        return self._item_mean_values
+    
+    def _update_popularity(self, product_ids, ratings, replaced_ids=None, replaced_ratings=None):
+        """
+        Add raw ratings to the per-item popularity statistics and re-rank the items
+        
+        Items are ranked by rating count times mean rating (ties by product id), and
+        the ranking is also split into segments by gender, masterCategory and both,
+        so cold-start requests only slice a precomputed ranking.
+        
+        Ratings that the new ones replace are passed as replaced_ids and
+        replaced_ratings and are taken out of the statistics.
+        """
+        product_ids = np.asarray(product_ids)
+        ratings = np.asarray(ratings, dtype=float)
+        signs = np.ones(len(product_ids))
+        if replaced_ids is not None:
+            product_ids = np.concatenate([product_ids, np.asarray(replaced_ids, dtype=product_ids.dtype)])
+            ratings = np.concatenate([ratings, np.asarray(replaced_ratings, dtype=float)])
+            signs = np.concatenate([signs, -np.ones(len(replaced_ids))])
+        
+        codes, unique_ids = pd.factorize(product_ids, sort=True)
+        popularity = pd.DataFrame({
+            'count': np.bincount(codes, weights=signs, minlength=len(unique_ids)).astype(np.int64),
+            'sum': np.bincount(codes, weights=signs * ratings, minlength=len(unique_ids))
+        }, index=pd.Index(unique_ids, name='product_id'))
+        if self.item_popularity is not None:
+            popularity = self.item_popularity[['count', 'sum']].add(popularity, fill_value=0)
+            popularity['count'] = popularity['count'].astype(np.int64)
+        
+        popularity = popularity.sort_index()
+        popularity['mean'] = popularity['sum'] / popularity['count']
+        popularity['score'] = popularity['count'] * popularity['mean']
+        self.item_popularity = popularity.sort_values('score', ascending=False, kind='stable')
+        
+        # Positions in the ranking of each segment's items, most popular first
+        self.popularity_segments = {}
+        if self.items_data is not None and {'gender', 'masterCategory'}.issubset(self.items_data.columns):
+            attributes = self.items_data.reindex(self.item_popularity.index)[['gender', 'masterCategory']]
+            for column in ['gender', 'masterCategory']:
+                for value, positions in attributes.groupby(column, sort=False).indices.items():
+                    key = (value, None) if column == 'gender' else (None, value)
+                    self.popularity_segments[key] = positions.astype(np.int32)
+            for value, positions in attributes.groupby(['gender', 'masterCategory'], sort=False).indices.items():
+                self.popularity_segments[value] = positions.astype(np.int32)
+    
+    def get_popular_items(self, n=10, gender=None, master_category=None):
+        """
+        The n most popular items, optionally within a gender and/or masterCategory segment
+        
+        Returns:
+            Series of popularity scores (rating count times mean rating) indexed by item id
+        """
+        if gender is None and master_category is None:
+            return self.item_popularity['score'].iloc[:n]
+        positions = self.popularity_segments.get((gender, master_category), np.zeros(0, dtype=np.int32))
+        return self.item_popularity['score'].iloc[positions[:n]]
+    
+    def _format_recommendations(self, item_ids):
+        """
+        Format recommendations with item details
+        """
+        catalog = self._get_catalog()
+        rows = catalog.rows(item_ids)
+        known = rows >= 0
+        
+        # Look up each displayed attribute for all known items at once
+        fields = [('name', 'productDisplayName'), ('category', 'masterCategory'),
+                  ('subcategory', 'subCategory'), ('article_type', 'articleType'),
+                  ('color', 'baseColour'), ('gender', 'gender')]
+        values = {key: catalog.column(column, rows[known]).tolist()
+                  for key, column in fields if column in catalog.columns}
+        
+        recommendations = []
+        position = 0
+        for item_id, is_known in zip(item_ids, known):
+            recommendation = {'item_id': item_id}
+            for key, _ in fields:
+                default = f'Item {item_id}' if key == 'name' else 'Unknown'
+                recommendation[key] = values[key][position] if is_known and key in values else default
+            position += int(is_known)
+            recommendations.append(recommendation)
+        return recommendations
+    
+    def _write_artifact(self, model_path, model_format, model_arrays, model_fields):
+        """
+        Write the arrays shared by every model built on the rating matrix (ids,
+        ratings, item means, popularity ranking) plus model_arrays as .npy files,
+        items.csv and a manifest.json holding model_fields.
+        
+        The files are written to a staging directory next to model_path that then
+        replaces it, so arrays memory-mapped from an artifact already saved at
+        model_path (e.g. a loaded model that was updated) are never overwritten.
+        """
+        model_path = os.path.normpath(model_path)
+        parent = os.path.dirname(os.path.abspath(model_path))
+        os.makedirs(parent, exist_ok=True)
+        staging_path = tempfile.mkdtemp(prefix=f".{os.path.basename(model_path)}.", dir=parent)
+        try:
+            arrays = self._write_artifact_files(staging_path, model_format, model_arrays, model_fields)
+            os.chmod(staging_path, 0o755)
+        except BaseException:
+            shutil.rmtree(staging_path, ignore_errors=True)
+            raise
+        
+        # Swap the staged artifact in; the previous one is moved aside first and
+        # removed afterwards (open memory maps of its files stay valid on POSIX)
+        retired_path = None
+        if os.path.lexists(model_path):
+            retired_path = f"{staging_path}.old"
+            os.replace(model_path, retired_path)
+        os.replace(staging_path, model_path)
+        if retired_path is not None:
+            if os.path.isdir(retired_path):
+                shutil.rmtree(retired_path, ignore_errors=True)
+            else:
+                os.remove(retired_path)
+        
+        record_counts(self, arrays=len(arrays), bytes=sum(np.asarray(array).nbytes for array in arrays.values()))
+        print(f"Model saved to {model_path}")
+    
+    def _write_artifact_files(self, model_path, model_format, model_arrays, model_fields):
+        """
+        Write the files of a directory artifact into the existing model_path directory
+        
+        Returns:
+            Dictionary of the arrays written
+        """
+        arrays = {
+            'item_ids': self.item_ids,
+            'user_ids': self.user_ids,
+            'ratings_data': self.user_item_matrix.data,
+            'ratings_indices': self.user_item_matrix.indices,
+            'ratings_indptr': self.user_item_matrix.indptr,
+            'item_means': self._get_item_mean_values(),
+            'popularity_ids': self.item_popularity.index.values,
+            'popularity_count': self.item_popularity['count'].values,
+            'popularity_sum': self.item_popularity['sum'].values
+        }
+        
+        # Popularity segments as one CSR-like array of ranking positions
+        segment_keys = list(self.popularity_segments)
+        segment_sizes = [len(self.popularity_segments[key]) for key in segment_keys]
+        arrays['segment_indptr'] = np.concatenate(([0], np.cumsum(segment_sizes))).astype(np.int64)
+        arrays['segment_positions'] = (np.concatenate([self.popularity_segments[key] for key in segment_keys])
+                                       if segment_keys else np.zeros(0, dtype=np.int32))
+        
+        # Sort order of ids that are not sorted (ids appended by update()), so
+        # load_model can binary-search them without sorting
+        for name, index in [('item', self.item_index), ('user', self.user_index)]:
+            if not isinstance(index, _IdIndex):
+                index = _IdIndex.from_ids(arrays[f'{name}_ids'])
+            if index.order is not None:
+                arrays[f'{name}_order'] = index.order
+        arrays.update(model_arrays)
+        
+        for name, array in arrays.items():
+            array = np.asarray(array)
+            if array.dtype == object:
+                array = array.astype(str)
+            np.save(os.path.join(model_path, f"{name}.npy"), array, allow_pickle=False)
+        
+        self.items_data.to_csv(os.path.join(model_path, "items.csv"), index_label='id')
+        
+        manifest = {
+            'format': model_format,
+            'version': self.ARTIFACT_VERSION,
+            **model_fields,
+            'id_order': True,
+            'ratings_shape': list(self.user_item_matrix.shape),
+            'segment_keys': [[None if part is None else str(part) for part in key] for key in segment_keys],
+            'arrays': {name: {'dtype': np.asarray(array).dtype.str, 'shape': list(np.shape(array))}
+                       for name, array in arrays.items()}
+        }
+        with open(os.path.join(model_path, "manifest.json"), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        return arrays
+    
+    def _read_artifact(self, model_path, model_format):
+        """
+        Check the manifest of a directory artifact and load the arrays shared by
+        every model built on the rating matrix, memory-mapping them
+        
+        Returns:
+            Tuple of (manifest, function loading a named array of the artifact)
+        """
+        with open(os.path.join(model_path, "manifest.json")) as f:
+            manifest = json.load(f)
+        if manifest.get('format') != model_format or manifest.get('version') != self.ARTIFACT_VERSION:
+            raise ValueError(f"Unsupported model artifact in {model_path}")
+        
+        def load(name):
+            return np.load(os.path.join(model_path, f"{name}.npy"), mmap_mode='r')
+        
+        self.item_ids = load('item_ids')
+        self.item_index = self._load_id_index(manifest, load, 'item')
+        self.user_ids = load('user_ids')
+        self.user_index = self._load_id_index(manifest, load, 'user')
+        # The saved matrix is already canonical; wrap the mapped arrays without copying
+        ratings = csr_matrix((load('ratings_data'), load('ratings_indices'), load('ratings_indptr')),
+                             shape=tuple(manifest['ratings_shape']), copy=False)
+        ratings.has_sorted_indices = True
+        self.user_item_matrix = ratings
+        self._item_ratings = None
+        
+        self._item_mean_values = load('item_means')
+        self.item_means = _IdValues(self.item_index, self._item_mean_values)
+        
+        popularity = pd.DataFrame({'count': load('popularity_count'), 'sum': load('popularity_sum')},
+                                  index=pd.Index(load('popularity_ids'), name='product_id'))
+        popularity['mean'] = popularity['sum'] / popularity['count']
+        popularity['score'] = popularity['count'] * popularity['mean']
+        self.item_popularity = popularity
+        segment_indptr = load('segment_indptr')
+        segment_positions = load('segment_positions')
+        self.popularity_segments = {
+            tuple(key): segment_positions[segment_indptr[i]:segment_indptr[i + 1]]
+            for i, key in enumerate(manifest['segment_keys'])
+        }
+        
+        self._set_items_data(pd.read_csv(os.path.join(model_path, "items.csv"), index_col='id'))
+        return manifest, load
+    
+    @staticmethod
+    def _load_id_index(manifest, load, name):
+        """
+        Id index over the memory-mapped {name}_ids of an artifact; the sort order
+        is read from {name}_order when the ids were saved unsorted
+        """
+        ids = load(f'{name}_ids')
+        if not manifest.get('id_order'):
+            # Artifacts written before the order arrays may hold unsorted ids
+            return _IdIndex.from_ids(ids)
+        if f'{name}_order' in manifest['arrays']:
+            return _IdIndex(ids, load(f'{name}_order'))
+        return _IdIndex(ids)
+    
+    def load_model(self, model_path):
+        """
+        Load a trained model from a directory artifact
+        """
+        if not os.path.isdir(model_path):
+            raise ValueError(f"{model_path} is not a {type(self).__name__} model artifact directory")
+        return self._load_artifact(model_path)
+    
+    @abstractmethod
+    def _load_artifact(self, model_path):
+        """
+        Load a directory artifact written by save_model
+        """
+    
+    @abstractmethod
+    def fit(self):
+        """
+        Train the model on the loaded ratings
+        """
+    
+    @profiled_phase('train')
+    def train(self, ratings_path, styles_path, sample_size=None, use_enhanced_dataset=True, max_items=None,
+              **fit_options):
+        """
+        Complete training pipeline: load the ratings (keeping the max_items most
+        rated items) and fit the model, passing fit_options to fit()
+        """
+        print(f"Training {self.MODEL_NAME}...")
+        
+        # Use enhanced dataset if available and requested
+        if use_enhanced_dataset:
+            enhanced_path = ratings_path.replace('.csv', '_enhanced.csv')
+            if os.path.exists(enhanced_path):
+                print(f"Using enhanced dataset: {enhanced_path}")
+                ratings_path = enhanced_path
+            else:
+                print(f"Enhanced dataset not found at {enhanced_path}, using original dataset")
+        
+        self.load_data(ratings_path, styles_path, sample_size, max_items=max_items)
+        self.fit(**fit_options)
+        
+        print("Training completed!")
+        return self
+
+class _IdIndex(Mapping):
+    """
+    Read-only id -> position mapping over an id array, answered by binary search
+    
+    The ids are searched through np.searchsorted, in place when they are sorted
+    (as built by load_data) or through a stored argsort order otherwise (ids
+    appended by update()). Nothing is built per id, so an index over
+    memory-mapped ids costs nothing to create.
+    """
+    def __init__(self, ids, order=None):
+        """
+        Args:
+            ids: Id array (positions are indices into it)
+            order: Stable argsort of ids, or None when ids are sorted
+        """
+        self.ids = ids
+        self.order = order
+        self._sorted_ids = ids if order is None else np.asarray(ids)[order]
+    
+    @classmethod
+    def from_ids(cls, ids):
+        """
+        Index an id array, sorting it only when it is not sorted already
+        """
+        ids = np.asarray(ids)
+        if len(ids) < 2 or bool(np.all(ids[1:] >= ids[:-1])):
+            return cls(ids)
+        return cls(ids, np.argsort(ids, kind='stable'))
+    
+    def __len__(self):
+        return len(self.ids)
+    
+    def __iter__(self):
+        return iter(np.asarray(self.ids).tolist())
+    
+    def __contains__(self, key):
+        return self.position(key) >= 0
+    
+    def __getitem__(self, key):
+        position = self.position(key)
+        if position < 0:
+            raise KeyError(key)
+        return position
+    
+    def get(self, key, default=None):
+        position = self.position(key)
+        return default if position < 0 else position
+    
+    def position(self, key) -> int:
+        """
+        Position of a single id (-1 when the id is unknown)
+        """
+        try:
+            slot = int(np.searchsorted(self._sorted_ids, key))
+            if slot >= len(self._sorted_ids) or self._sorted_ids[slot] != key:
+                return -1
+        except (TypeError, ValueError, OverflowError):
+            return -1
+        return slot if self.order is None else int(self.order[slot])
+    
+    def positions(self, keys) -> np.ndarray:
+        """
+        Positions of a batch of ids (-1 for unknown ids)
+        """
+        keys = np.asarray(keys)
+        if len(self._sorted_ids) == 0 or len(keys) == 0:
+            return np.full(len(keys), -1, dtype=np.int64)
+        slots = np.minimum(np.searchsorted(self._sorted_ids, keys), len(self._sorted_ids) - 1)
+        found = np.asarray(self._sorted_ids)[slots] == keys
+        positions = slots if self.order is None else np.asarray(self.order)[slots]
+        return np.where(found, positions, -1).astype(np.int64)
+
+class _IdValues(Mapping):
+    """
+    Read-only id -> value mapping over an _IdIndex and a value array aligned
+    with its ids (e.g. the item means)
+    """
+    def __init__(self, index, values):
+        self.index = index
+        self.values_array = values
+    
+    def __len__(self):
+        return len(self.index)
+    
+    def __iter__(self):
+        return iter(self.index)
+    
+    def __contains__(self, key):
+        return key in self.index
+    
+    def __getitem__(self, key):
+        return float(self.values_array[self.index[key]])
+    
+    def get(self, key, default=None):
+        position = self.index.position(key)
+        return default if position < 0 else float(self.values_array[position])
+
+class _ItemFrequencyCounter:
+    """
+    Streaming per-item rating counts for choosing the most rated items
+    
+    Counts are exact while at most capacity distinct items have been seen. Past
+    that the counter becomes a mergeable SpaceSaving summary of the capacity
+    largest counts: every chunk's exact counts are merged in, items new to the
+    summary are charged the largest count dropped so far (an upper bound on
+    their earlier ratings), and the summary is cut back to capacity items.
+    """
+    def __init__(self, capacity=1000000):
+        self.capacity = capacity
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.floor = 0
+        self.exact = True
+    
+    def __len__(self):
+        return len(self.ids)
+    
+    def add(self, item_ids):
+        """
+        Merge the counts of one chunk of product ids
+        """
+        chunk_ids, chunk_counts = np.unique(item_ids, return_counts=True)
+        if len(chunk_ids) == 0:
+            return
+        
+        # Untracked items may have had up to floor ratings before this chunk
+        known = np.isin(chunk_ids, self.ids, assume_unique=True)
+        chunk_counts = chunk_counts.astype(np.int64)
+        chunk_counts[~known] += self.floor
+        
+        ids, inverse = np.unique(np.concatenate([self.ids, chunk_ids]), return_inverse=True)
+        counts = np.bincount(inverse, weights=np.concatenate([self.counts, chunk_counts]))
+        self.ids, self.counts = ids, counts.astype(np.int64)
+        
+        if len(self.ids) > self.capacity:
+            order = np.argsort(-self.counts, kind='stable')
+            self.floor = max(self.floor, int(self.counts[order[self.capacity]]))
+            kept = np.sort(order[:self.capacity])
+            self.ids, self.counts = self.ids[kept], self.counts[kept]
+            self.exact = False
+    
+    def top(self, n):
+        """
+        Sorted ids of the n most rated items (ties go to the smaller id)
+        """
+        order = np.argsort(-self.counts, kind='stable')[:n]
+        return np.sort(self.ids[order])
+
+class _RecommendationWriter:
+    """
+    Collects (user_id, rank, item_id, score) rows in memory, or streams them to
+    a CSV or Parquet file block by block
+    """
+    def __init__(self, output_path=None):
+        self.output_path = output_path
+        self.blocks = []
+        self.parquet_writer = None
+        self.csv_file = None
+        if output_path is not None and output_path.endswith('.parquet'):
+            try:
+                import pyarrow  # noqa: F401
+                import pyarrow.parquet  # noqa: F401
+            except ImportError:
+                raise ImportError("Writing Parquet needs pyarrow; use a .csv output path instead")
+        elif output_path is not None:
+            self.csv_file = open(output_path, 'w', newline='')
+            self.csv_file.write("user_id,rank,item_id,score\n")
+    
+    def write(self, user_ids, ranks, item_ids, scores):
+        # Every block gets the same column dtypes so that all blocks share one
+        # Parquet schema (known users come as the model's id dtype, unknown users
+        # as whatever the caller passed)
+        block = pd.DataFrame({
+            'user_id': self._id_column(user_ids),
+            'rank': np.asarray(ranks, dtype=np.int32),
+            'item_id': self._id_column(item_ids),
+            'score': np.asarray(scores, dtype=np.float32)
+        })
+        if self.output_path is None:
+            self.blocks.append(block)
+        elif self.csv_file is not None:
+            block.to_csv(self.csv_file, header=False, index=False)
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(block, preserve_index=False)
+            if self.parquet_writer is None:
+                self.parquet_writer = pq.ParquetWriter(self.output_path, table.schema)
+            self.parquet_writer.write_table(table)
+    
+    @staticmethod
+    def _id_column(ids):
+        """
+        Ids as int64 when they are integers (float64 for float ids, strings otherwise)
+        """
+        ids = np.asarray(ids)
+        if ids.dtype.kind in 'iu':
+            return ids.astype(np.int64)
+        if ids.dtype.kind == 'f':
+            return ids.astype(np.float64)
+        return ids.astype(str).astype(object)
+    
+    def close(self):
+        if self.csv_file is not None:
+            self.csv_file.close()
+            return self.output_path
+        if self.output_path is not None:
+            if self.parquet_writer is not None:
+                self.parquet_writer.close()
+            return self.output_path
+        if not self.blocks:
+            return pd.DataFrame(columns=['user_id', 'rank', 'item_id', 'score']).to_records(index=False)
+        return pd.concat(self.blocks, ignore_index=True).to_records(index=False)
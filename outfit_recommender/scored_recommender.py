@@ -0,0 +1,137 @@
+import numpy as np
+from abc import abstractmethod
+from rating_recommender import RatingRecommender, _RecommendationWriter
+from ranking import top_k, top_k_per_row
+from instrumentation import profiled_phase
+
+class ScoredRecommender(RatingRecommender):
+    """
+    Base class of the models that score every item for a user at once (ALS, EASE)
+    
+    Data loading, popularity ranking, artifacts and result formatting come from
+    RatingRecommender. Subclasses implement fit, _score_users (dense users x items
+    scores), _predict_known_rating and find_similar_items, and name their trained
+    arrays and hyperparameters in MODEL_ARRAYS and MODEL_FIELDS, from which the
+    fitted check and the directory artifact are handled here. Recommendations for
+    single users and for batches of users are served from _score_users.
+    """
+    
+    # Format name written to the artifact manifest
+    MODEL_FORMAT = None
+    
+    # Trained arrays saved as .npy files (the first one is set once the model is fitted)
+    MODEL_ARRAYS = ()
+    
+    # Hyperparameters saved in the artifact manifest
+    MODEL_FIELDS = ()
+    
+    def _check_fitted(self):
+        if getattr(self, self.MODEL_ARRAYS[0]) is None:
+            raise ValueError("Model not trained. Call fit() first.")
+    
+    @abstractmethod
+    def _score_users(self, user_rows):
+        """
+        Scores of a block of users for every item (float32, users x items)
+        """
+    
+    @profiled_phase('save_model')
+    def save_model(self, model_path):
+        """
+        Save the trained model as a directory artifact (trained arrays, rating
+        matrix, id maps, item means and popularity ranking as .npy files)
+        """
+        self._check_fitted()
+        self._write_artifact(model_path, self.MODEL_FORMAT,
+                             {name: getattr(self, name) for name in self.MODEL_ARRAYS},
+                             {name: getattr(self, name) for name in self.MODEL_FIELDS})
+    
+    def _load_artifact(self, model_path):
+        """
+        Load a directory artifact written by save_model, memory-mapping the arrays
+        """
+        manifest, load = self._read_artifact(model_path, self.MODEL_FORMAT)
+        for name in self.MODEL_ARRAYS:
+            setattr(self, name, load(name))
+        for name in self.MODEL_FIELDS:
+            setattr(self, name, manifest[name])
+        
+        print(f"Model loaded from {model_path}")
+        return self
+    
+    def get_item_recommendations(self, user_id, n_recommendations=10, k=10):
+        """
+        Get item recommendations for a user (k is ignored)
+        """
+        if user_id not in self.user_index:
+            # For new users, recommend popular items
+            top_items = self.get_popular_items(n_recommendations).index.tolist()
+            return self._format_recommendations(top_items)
+        
+        self._check_fitted()
+        user_row = self.user_index[user_id]
+        predictions = self._score_users([user_row])[0]
+        unrated = np.flatnonzero(self._get_user_ratings(user_id) == 0)
+        
+        top = top_k(predictions[unrated], n_recommendations)
+        top_items = self.item_ids[unrated[top]].tolist()
+        
+        return self._format_recommendations(top_items)
+    
+    def recommend_batch(self, user_ids=None, n=10, k=10, output_path=None, block_size=256, n_jobs=1):
+        """
+        Recommend n items for many users at once
+        
+        Users are scored in blocks of block_size with one dense product each
+        (block_size x n_items float32 scores), which BLAS already spreads over the
+        cores; k and n_jobs are accepted for interface compatibility. Each user gets
+        the same items as get_item_recommendations; users unknown to the model get
+        the popular items, listed after the known users.
+        
+        Returns:
+            Structured array with user_id, rank, item_id and score fields, or the
+            output path when the rows were written to a file
+        """
+        self._check_fitted()
+        user_ids = self.user_ids if user_ids is None else np.asarray(user_ids)
+        positions = self.user_index.positions(user_ids)
+        known = positions >= 0
+        print(f"Recommending {n} items for {len(user_ids):,} users "
+              f"({int((~known).sum()):,} unknown to the model)")
+        
+        known_rows = positions[known]
+        writer = _RecommendationWriter(output_path)
+        try:
+            for start in range(0, len(known_rows), block_size):
+                user_rows = known_rows[start:start + block_size]
+                scores = self._score_users(user_rows)
+                
+                # Rated items can never be recommended
+                rated = self.user_item_matrix[user_rows]
+                scores[np.repeat(np.arange(len(user_rows)), np.diff(rated.indptr)), rated.indices] = -np.inf
+                
+                users, items = top_k_per_row(scores, n)
+                ranks = np.arange(len(users)) - np.searchsorted(users, users) + 1
+                writer.write(self.user_ids[user_rows[users]], ranks, self.item_ids[items], scores[users, items])
+                print(f"Recommended for {min(start + block_size, len(known_rows)):,}/{len(known_rows):,} users")
+            
+            unknown_users = user_ids[~known]
+            if len(unknown_users) > 0:
+                popular = self.get_popular_items(n)
+                writer.write(np.repeat(unknown_users, len(popular)),
+                             np.tile(np.arange(1, len(popular) + 1), len(unknown_users)),
+                             np.tile(popular.index.values, len(unknown_users)),
+                             np.tile(popular.values, len(unknown_users)))
+        finally:
+            result = writer.close()
+        
+        if output_path is not None:
+            print(f"Recommendations saved to {output_path}")
+        return result
+    
+    def get_similar_items(self, item_id, n_similar=10):
+        """
+        Get items similar to a given item
+        """
+        similar_items = [item for item, _ in self.find_similar_items(item_id, n_similar)]
+        return self._format_recommendations(similar_items)
@@ -6,17 +6,30 @@ Uses the dataset with synthetic ratings and improved parameters
 
 import os
 import sys
+import argparse
 import numpy as np
 from item_based_cf import ItemBasedCollaborativeFiltering
+from instrumentation import PhaseProfiler
 
-def main():
+def main(keep_statistics=False):
+    """
+    Train, save and summarize the model
+    
+    Args:
+        keep_statistics: Keep the pair statistics so the saved model can be
+            refreshed with model.update(delta_path); they take several times the
+            memory and disk space of the neighbor index, so only deployments that
+            run update() need them
+    """
     print("Starting Item-Based Collaborative Filtering Training...")
     print("=" * 70)
     
     # Define paths - using dataset
     ratings_path = "data/user_ratings.csv"
     styles_path = "data/styles.csv"
-    model_save_path = "models/item_based_cf_model.pkl"
+    model_save_path = "models/item_based_cf_model"
+    profile_path = "models/item_based_cf_model_profile.json"
+    checkpoint_dir = "models/item_based_cf_checkpoint"
     
     # Check if data files exist
     if not os.path.exists(ratings_path):
@@ -34,13 +47,20 @@ def main():
     try:
         # Initialize and train the model with parameters
         print("Initializing Item-Based Collaborative Filtering model...")
-        model = ItemBasedCollaborativeFiltering()
+        # Record time, CPU and memory of every training phase
+        profiler = PhaseProfiler()
+        model = ItemBasedCollaborativeFiltering(profiler=profiler)
         
         print("Training the model with dataset...")
-        print("Using larger sample size for better correlation calculations...")
+        print("Using the full ratings file (sparse user-item matrix)...")
+        
+        if keep_statistics:
+            print("Keeping pair statistics for incremental updates (model.update)...")
         
-        # Use larger sample size with dataset (100,000 instead of 50,000)
-        model.train(ratings_path, styles_path, sample_size=100000)
+        # Build the similarity tiles on all available cores; finished tiles are
+        # checkpointed so a rerun after a crash resumes where this one stopped
+        model.train(ratings_path, styles_path, keep_statistics=keep_statistics, n_jobs=-1,
+                    checkpoint_dir=checkpoint_dir)
         
         # Save the trained model
         print("Saving the trained model...")
@@ -54,41 +74,42 @@ def main():
         print("\nModel Statistics:")
         print(f"- Number of users: {model.user_item_matrix.shape[0]}")
         print(f"- Number of items: {model.user_item_matrix.shape[1]}")
-        print(f"- Similarity matrix shape: {model.item_similarity_matrix.shape}")
+        print(f"- Number of ratings: {model.user_item_matrix.nnz:,}")
+        print(f"- Neighbors per item (top-K): {model.n_neighbors}")
+        print(f"- Similarity build: {model.build_info['wall_time']:.2f}s on {model.build_info['n_jobs']} worker(s), "
+              f"{model.build_info['speedup']:.2f}x speedup over a single core")
         
         # Calculate and display correlation statistics
         print("\nCorrelation Analysis:")
-        similarity_matrix = model.item_similarity_matrix
+        neighbor_scores = model.dequantize_scores(model.neighbor_scores)
+        n_items = len(model.item_ids)
         
-        # Convert to numpy array if it's a pandas DataFrame
-        if hasattr(similarity_matrix, 'values'):
-            sim_array = similarity_matrix.values
-        else:
-            sim_array = similarity_matrix
+        # Count items with at least one positively correlated neighbor
+        neighbor_counts = np.diff(model.neighbor_indptr)
+        items_with_neighbors = int(np.sum(neighbor_counts > 0))
         
-        # Count non-zero correlations
-        total_correlations = int(sim_array.size)
-        zero_correlations = int(np.sum(sim_array == 0.0))
-        non_zero_correlations = total_correlations - zero_correlations
+        print(f"- Stored neighbor pairs: {len(neighbor_scores):,} "
+              f"({model.precision} scores, {model.neighbor_scores.nbytes / 1024**2:.1f} MB)")
+        print(f"- Items with neighbors: {items_with_neighbors:,} ({items_with_neighbors/max(n_items, 1)*100:.2f}%)")
+        print(f"- Average neighbors per item: {neighbor_counts.mean() if n_items else 0:.2f}")
         
-        print(f"- Total correlations: {total_correlations:,}")
-        print(f"- Zero correlations: {zero_correlations:,} ({zero_correlations/total_correlations*100:.2f}%)")
-        print(f"- Non-zero correlations: {non_zero_correlations:,} ({non_zero_correlations/total_correlations*100:.2f}%)")
-        
-        if non_zero_correlations > 0:
-            non_zero_values = sim_array[sim_array != 0.0]
-            print(f"- Non-zero correlation range: {non_zero_values.min():.4f} to {non_zero_values.max():.4f}")
-            print(f"- Average non-zero correlation: {non_zero_values.mean():.4f}")
+        if len(neighbor_scores) > 0:
+            print(f"- Neighbor correlation range: {neighbor_scores.min():.4f} to {neighbor_scores.max():.4f}")
+            print(f"- Average neighbor correlation: {neighbor_scores.mean():.4f}")
         
         # Test with a sample recommendation
         print("\nTesting with sample recommendations...")
-        sample_user_id = model.user_item_matrix.index[0]
-        recommendations = model.get_item_recommendations(sample_user_id, n_recommendations=5)
+        sample_user_id = model.user_ids[0]
+        with profiler.phase('sample_recommendations'):
+            recommendations = model.get_item_recommendations(sample_user_id, n_recommendations=5)
         
         print(f"\nSample recommendations for user {sample_user_id}:")
         for i, rec in enumerate(recommendations, 1):
             print(f"{i}. {rec['name']} ({rec['category']} - {rec['article_type']})")
         
+        profiler.print_summary()
+        profiler.save(profile_path)
+        
     except Exception as e:
         print(f"Error during training: {str(e)}")
         import traceback
@@ -98,8 +119,11 @@ def main():
     print("\nTraining process completed!")
     print("The model should now have better correlation scores due to:")
     print("- Dataset with synthetic ratings")
-    print("- Larger sample size for training")
+    print("- Training on the full ratings file")
     print("- Improved data density")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Train the item-based collaborative filtering model")
+    parser.add_argument('--keep-statistics', action='store_true',
+                        help="keep the pair statistics needed to refresh the model with model.update()")
+    main(keep_statistics=parser.parse_args().keep_statistics)
\ No newline at end of file